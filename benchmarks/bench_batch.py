@@ -0,0 +1,76 @@
+"""Files-per-second for single vs. batched classification against the mock server
+
+Usage: python benchmarks/bench_batch.py --files 32 --latency 0.2 --parallel 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fitz  # noqa: E402
+from ai_processor import AIProcessor  # noqa: E402
+from mock_ollama import start_server  # noqa: E402
+
+
+def make_pdfs(directory, count):
+    """Write small single-page PDFs the rules tier cannot classify"""
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"notes_{index}.pdf")
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Meeting notes number {index} about the garden project.")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def run_single(processor, paths):
+    start = time.perf_counter()
+    for path in paths:
+        processor.process_file(path)
+    return time.perf_counter() - start
+
+
+def run_batched(processor, paths, batch_size):
+    start = time.perf_counter()
+    for offset in range(0, len(paths), batch_size):
+        processor.process_batch([{"path": path} for path in paths[offset:offset + batch_size]])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, parallel=args.parallel)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_pdfs(directory, args.files)
+        runs = [
+            ("single", lambda: run_single(AIProcessor(base_url), paths)),
+            ("batched (concurrent)", lambda: run_batched(
+                AIProcessor(base_url, batch_size=args.batch_size,
+                            batch_concurrency=args.parallel, batch_combine_pdfs=False),
+                paths, args.batch_size)),
+            ("batched (combined prompt)", lambda: run_batched(
+                AIProcessor(base_url, batch_size=args.batch_size), paths, args.batch_size)),
+        ]
+        for name, run in runs:
+            requests_before = server.request_count
+            elapsed = run()
+            requests = server.request_count - requests_before
+            print(f"{name:28} {args.files / elapsed:8.2f} files/s  "
+                  f"{requests:4d} requests  {elapsed:6.2f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
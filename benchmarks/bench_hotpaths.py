@@ -0,0 +1,141 @@
+"""Microbenchmarks for the per-file hot paths: hashing, PDF text, image encoding, category matching
+
+Usage: python benchmarks/bench_hotpaths.py [--save baseline.json] [--compare baseline.json]
+
+With --compare, exits non-zero when any case is more than --tolerance slower
+than the saved baseline.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import utils  # noqa: E402
+from file_organizer import FileOrganizerAgent  # noqa: E402
+from synthetic import image_bytes, paragraph, pdf_bytes, vocabulary  # noqa: E402
+
+DESCRIPTIONS = [
+    "documents",
+    '{"category": "invoices", "confidence": 0.92}',
+    "This image shows a screenshot of a spreadsheet with quarterly budget tables and "
+    "a chart; it could also be part of a presentation slide deck.",
+]
+
+
+def write(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def cases(directory):
+    """Yield (name, setup) pairs; setup writes the case's input and returns the callable to time
+
+    Inputs are built only for cases that run, so a filtered run stays quick and
+    one broken case does not stop the others. Each input is seeded by its own
+    parameters, so a filtered run times the same inputs as a full one.
+    """
+
+    def hash_case(size_mib, algorithm):
+        path = os.path.join(directory, f"blob_{size_mib}.bin")
+        if not os.path.exists(path):
+            write(directory, f"blob_{size_mib}.bin", os.urandom(size_mib * 1024 * 1024))
+        return lambda: utils.get_file_hash(path, algorithm)
+
+    def pdf_case(pages, max_chars=None):
+        path = write(directory, f"doc_{pages}.pdf", pdf_bytes(pages, random.Random(pages)))
+        return lambda: utils.extract_text_from_pdf(path, max_chars=max_chars)
+
+    def image_case(width, height, function):
+        path = write(directory, f"picture_{width}x{height}.jpg", image_bytes(width, height, random.Random(width)))
+        return lambda: function(path)
+
+    def category_case(description):
+        organizer = FileOrganizerAgent(os.path.join(directory, "sorted"))
+        return lambda: organizer.determine_category(description)
+
+    for size_mib in (1, 32):
+        for algorithm in ("md5", "blake2b"):
+            yield (f"get_file_hash {algorithm} {size_mib}MiB",
+                   lambda size_mib=size_mib, algorithm=algorithm: hash_case(size_mib, algorithm))
+
+    for pages in (1, 10, 50):
+        yield (f"extract_text_from_pdf {pages}p", lambda pages=pages: pdf_case(pages))
+        yield (f"extract_text_from_pdf {pages}p 4000 chars",
+               lambda pages=pages: pdf_case(pages, 4000))
+
+    for width, height in ((640, 480), (1920, 1080), (4032, 3024)):
+        yield (f"encode_image {width}x{height}",
+               lambda width=width, height=height: image_case(width, height, utils.encode_image))
+        yield (f"prepare_image {width}x{height}",
+               lambda width=width, height=height: image_case(width, height, utils.prepare_image))
+
+    long_text = paragraph(random.Random(1), vocabulary(random.Random(1)), 2000)
+    for index, description in enumerate(DESCRIPTIONS + [long_text]):
+        yield (f"determine_category text{index} ({len(description)} chars)",
+               lambda description=description: category_case(description))
+
+
+def measure(function, repeat=5):
+    """Best seconds per call over several runs of at least 0.2s each"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run cases containing this text")
+    parser.add_argument("--save", help="write results to a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, e.g. 0.25 for 25%%")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, setup in cases(directory):
+            if args.filter not in name:
+                continue
+            try:
+                seconds = measure(setup())
+            except Exception as e:
+                print(f"{name:48} failed: {e}")
+                failures.append(name)
+                continue
+            results[name] = seconds
+            line = f"{name:48} {seconds * 1000:10.3f} ms"
+            if name in baseline:
+                change = seconds / baseline[name] - 1
+                line += f"  {change:+7.1%}"
+                if change > args.tolerance:
+                    regressions.append(name)
+                    line += "  REGRESSION"
+            print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if failures:
+        print(f"{len(failures)} cases failed")
+    if regressions:
+        print(f"{len(regressions)} cases slower than baseline by more than {args.tolerance:.0%}")
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Throughput, p50/p99 latency and peak RSS of the whole watcher pipeline against the mock server
+
+Starts `src/main.py` on a temporary watch folder, drops synthetic PDFs and
+images into it and reads the per-file trace the daemon writes. Files answered
+per tier (cache, rules, similar, model) are read from its /metrics endpoint.
+
+Usage: python benchmarks/bench_pipeline.py --files 40 --latency 0.2 --parallel 2
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from mock_ollama import start_server
+from synthetic import generate
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def read_trace(path):
+    """Finished-file events from the daemon's trace, keyed by path"""
+    done = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("event") == "file":
+                    done[record["path"]] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_tier_counts(port):
+    """Files answered per tier, from the daemon's declutter_tier_files_total counter"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            text = response.read().decode("utf-8")
+    except OSError:
+        return {}
+    return {
+        tier: int(float(value))
+        for tier, value in re.findall(r'^declutter_tier_files_total\{tier="(\w+)"\} (\S+)$',
+                                      text, re.M)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="seconds each mock model request takes")
+    parser.add_argument("--parallel", type=int, default=2,
+                        help="requests the mock serves at the same time")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="files written per second (0 writes them all at once)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args, extra = parser.parse_known_args()
+
+    # Remaining KEY=VALUE arguments override the daemon's settings, e.g. BATCH_SIZE=8
+    overrides = dict(item.split("=", 1) for item in extra)
+
+    files = list(generate(args.files, args.seed))
+    server, base_url = start_server(latency=args.latency, parallel=args.parallel)
+    with tempfile.TemporaryDirectory() as directory:
+        watch = os.path.join(directory, "downloads")
+        os.makedirs(watch)
+        trace_path = os.path.join(directory, "trace.jsonl")
+        metrics_port = free_port()
+        env = {
+            **os.environ,
+            "DOWNLOADS_PATH": watch,
+            "WATCH_CONFIG": "",
+            "CATEGORIES_PATH": "",
+            "INFERENCE_HOST": base_url,
+            "ORGANIZATION_BASE_DIR": os.path.join(directory, "sorted"),
+            "CACHE_DB_PATH": os.path.join(directory, "cache.db"),
+            "JOURNAL_PATH": os.path.join(directory, "journal.jsonl"),
+            "TRACE_PATH": trace_path,
+            "METRICS_HOST": "127.0.0.1",
+            "METRICS_PORT": str(metrics_port),
+            "STARTUP_SCAN": "false",
+            "QUIET_PERIOD": "0.5",
+            "LOG_LEVEL": "WARNING",
+            **overrides,
+        }
+        daemon = subprocess.Popen(
+            [sys.executable, "-W", "ignore", os.path.join(ROOT, "src", "main.py")], env=env)
+        time.sleep(2)  # let the observer start
+
+        written = {}
+        started = time.time()
+        for index, (name, data) in enumerate(files):
+            if args.rate > 0:
+                time.sleep(max(0.0, started + index / args.rate - time.time()))
+            path = os.path.join(watch, name)
+            with open(path, "wb") as f:
+                f.write(data)
+            written[path] = time.time()
+
+        deadline = time.monotonic() + args.timeout
+        done = {}
+        while len(done) < len(files) and time.monotonic() < deadline:
+            if daemon.poll() is not None:
+                break
+            time.sleep(0.5)
+            done = read_trace(trace_path)
+
+        tiers = read_tier_counts(metrics_port)
+        daemon.send_signal(signal.SIGINT)
+        try:
+            daemon.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            daemon.kill()
+            daemon.wait()
+        done = read_trace(trace_path)
+    server.shutdown()
+
+    latencies = [record["ts"] - written[path] for path, record in done.items() if path in written]
+    finished = max((record["ts"] for record in done.values()), default=started)
+    elapsed = finished - started
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_rss_mib = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    statuses = {}
+    for record in done.values():
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    print(f"files        {len(done)}/{len(files)} {statuses}")
+    print(f"tiers        {tiers}")
+    print(f"model calls  {server.request_count} (+{server.warm_up_count} warm-up)")
+    print(f"throughput   {len(done) / elapsed if elapsed > 0 else 0:.2f} files/s")
+    print(f"latency p50  {percentile(latencies, 0.50):.3f}s")
+    print(f"latency p99  {percentile(latencies, 0.99):.3f}s")
+    print(f"peak RSS     {peak_rss_mib:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Cold-start cost: module import time (from -X importtime) and time until the daemon watches
+
+Imports `main` in fresh interpreters and reports the slowest imports, then
+starts the daemon against the mock server and times how long it takes until
+the observer is running.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_ollama import start_server
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC = os.path.join(ROOT, "src")
+READY_MESSAGE = "Press Ctrl+C to stop"
+
+
+def import_times(module):
+    """{module: (self µs, cumulative µs)} for one import of module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[12:].split("|"))
+        if self_us.isdigit():
+            times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def time_to_watch(base_url):
+    """Seconds from launching the daemon until it logs that the observer is running"""
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DOWNLOADS_PATH": os.path.join(directory, "downloads"),
+            "WATCH_CONFIG": "",
+            "CATEGORIES_PATH": "",
+            "INFERENCE_HOST": base_url,
+            "ORGANIZATION_BASE_DIR": os.path.join(directory, "sorted"),
+            "CACHE_DB_PATH": os.path.join(directory, "cache.db"),
+            "JOURNAL_PATH": os.path.join(directory, "journal.jsonl"),
+            "METRICS_PORT": "0",
+            "STARTUP_SCAN": "false",
+            "LOG_LEVEL": "INFO",
+        }
+        os.makedirs(env["DOWNLOADS_PATH"])
+        started = time.perf_counter()
+        daemon = subprocess.Popen(
+            [sys.executable, "-W", "ignore", os.path.join(SRC, "main.py")],
+            env=env, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, text=True,
+        )
+        try:
+            for line in daemon.stderr:
+                if READY_MESSAGE in line:
+                    return time.perf_counter() - started
+            raise RuntimeError("daemon exited before watching")
+        finally:
+            daemon.kill()
+            daemon.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    totals = [run[args.module][1] / 1000 for run in runs]
+    print(f"import {args.module:24} {statistics.median(totals):8.1f} ms (median of {args.repeat})")
+    # The slowest direct and indirect imports in the median run
+    median_run = sorted(runs, key=lambda run: run[args.module][1])[len(runs) // 2]
+    slowest = sorted(median_run.items(), key=lambda item: item[1][0], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"  {name:40} self {self_us / 1000:7.1f} ms  cumulative {cumulative_us / 1000:7.1f} ms")
+
+    server, base_url = start_server(latency=0.05)
+    watch_times = [time_to_watch(base_url) for _ in range(args.repeat)]
+    server.shutdown()
+    print(f"daemon watching after   {statistics.median(watch_times) * 1000:8.1f} ms "
+          f"(median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Output tokens and latency per call for free-text vs. structured answers against the mock server
+
+Usage: python benchmarks/bench_structured.py --files 16 --latency 0.05 --token-latency 0.01
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from ai_processor import AIProcessor  # noqa: E402
+from bench_batch import make_pdfs  # noqa: E402
+from mock_ollama import start_server  # noqa: E402
+
+
+def run(processor, paths):
+    start = time.perf_counter()
+    answers = [processor.process_file(path) for path in paths]
+    return time.perf_counter() - start, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--max-output-tokens", type=int, default=32)
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        latency=args.latency, parallel=1, token_latency=args.token_latency)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_pdfs(directory, args.files)
+        for name, structured in (("free text", False), ("structured", True)):
+            processor = AIProcessor(
+                base_url, structured_output=structured,
+                max_output_tokens=args.max_output_tokens)
+            elapsed, answers = run(processor, paths)
+            stats = processor.inference_stats()
+            print(f"{name:12} {stats['output_tokens_per_call']:6.1f} tokens/call  "
+                  f"{stats['seconds_per_call'] * 1000:7.1f} ms/call  "
+                  f"{args.files / elapsed:7.2f} files/s  answer={answers[0]!r:.40}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
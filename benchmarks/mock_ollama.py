@@ -0,0 +1,175 @@
+"""Local stand-in for the Ollama HTTP API with configurable latency
+
+Run standalone with `python benchmarks/mock_ollama.py --port 11435 --latency 0.5`
+or start it in-process with `start_server()`. Free-text answers ramble the way
+small models do unless the request sets a JSON `format`, and every generated
+token adds `token_latency` seconds, so output limits show up in timings.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/chat and /api/generate with a fixed category after a delay"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        # A generate request without a prompt only loads the model (a warm-up)
+        if self.path == "/api/generate" and not request.get("prompt"):
+            self.server.warm_up_count += 1
+        else:
+            self.server.request_count += 1
+
+        if self.path == "/api/chat":
+            prompt = " ".join(
+                str(message.get("content", "")) for message in request.get("messages", [])
+            )
+        elif self.path == "/api/generate":
+            prompt = request.get("prompt", "")
+        else:
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        content = self.server.answer(prompt, request)
+        # A word is roughly one token; num_predict cuts generation short
+        words = content.split(" ")
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict and num_predict > 0 and len(words) > num_predict:
+            content = " ".join(words[:num_predict])
+        eval_count = min(len(words), num_predict or len(words))
+        duration = self.server.latency + eval_count * self.server.token_latency
+
+        # Parallel slots model a server that can only run so many requests at once
+        with self.server.slots:
+            time.sleep(duration)
+
+        final = {
+            "model": request.get("model", self.server.model),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int(duration * 1e9),
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": eval_count,
+        }
+        if self.path == "/api/chat":
+            message = {"role": "assistant", "content": content}
+        else:
+            message = None
+
+        if request.get("stream", True):
+            chunks = []
+            if message is not None:
+                chunks.append({**final, "done": False, "message": message})
+                final["message"] = {"role": "assistant", "content": ""}
+            else:
+                chunks.append({**final, "done": False, "response": content})
+                final["response"] = ""
+            chunks.append(final)
+            body = b"".join(json.dumps(chunk).encode("utf-8") + b"\n" for chunk in chunks)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            if message is not None:
+                final["message"] = message
+            else:
+                final["response"] = content
+            self._send_json(final)
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    """HTTP server holding the mock's latency and answer settings"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, parallel=1, category="documents",
+                 model="qwen3-vl:2b", token_latency=0.0):
+        super().__init__(address, MockOllamaHandler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.slots = threading.Semaphore(parallel)
+        self.category = category
+        self.model = model
+        self.request_count = 0  # classification requests, not counting warm-ups
+        self.warm_up_count = 0
+
+    def answer(self, prompt, request):
+        """Reply in whichever shape the prompt asks for"""
+        numbers = re.findall(r"Document (\d+):", prompt)
+        structured = bool(request.get("format"))
+        if numbers and structured:
+            return json.dumps({"results": [
+                {"document": int(number), "category": self.category} for number in numbers]})
+        if numbers:
+            return "\n".join(f"{number}: {self.category}" for number in numbers)
+        if structured:
+            return json.dumps({"category": self.category, "confidence": 0.9})
+        return (
+            f"Looking at the content, it contains text laid out like a typical "
+            f"{self.category[:-1]}, with headings and paragraphs rather than tables, "
+            f"slides or payment details. The most suitable category is therefore: "
+            f"{self.category}"
+        )
+
+
+def start_server(port=0, latency=0.2, parallel=1, category="documents", token_latency=0.0):
+    """Start the mock in a background thread and return (server, base_url)"""
+    server = MockOllamaServer(
+        ("127.0.0.1", port), latency, parallel, category, token_latency=token_latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="seconds each request takes")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="requests the mock serves at the same time")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="extra seconds per generated token")
+    parser.add_argument("--category", default="documents")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        ("127.0.0.1", args.port), args.latency, args.parallel, args.category,
+        token_latency=args.token_latency)
+    print(f"Mock Ollama listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Synthetic downloads for benchmarks: PDFs with varying page counts and images of varying size
+
+File names match none of the filename rules, and every file has its own text
+or picture, so files reach the model instead of the rules or similarity tiers.
+
+Run standalone with `python benchmarks/synthetic.py /tmp/downloads --files 50`.
+"""
+import argparse
+import io
+import os
+import random
+
+import fitz
+from PIL import Image
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+PDF_PAGES = (1, 2, 5, 10, 40)
+IMAGE_SIZES = ((640, 480), (1280, 720), (1920, 1080), (4032, 3024))
+
+
+def vocabulary(rng, size=60):
+    """Made-up words for one document, so no two documents share their word shingles"""
+    return ["".join(rng.choice(LETTERS) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def paragraph(rng, words, count=120):
+    return " ".join(rng.choice(words) for _ in range(count))
+
+
+def pdf_bytes(pages, rng):
+    """A PDF with a few paragraphs of filler text in its own vocabulary on every page"""
+    words = vocabulary(rng)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), paragraph(rng, words, 300), fontsize=10)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def image_bytes(width, height, rng, image_format="JPEG"):
+    """A random coarse pattern under noise: distinct perceptual hashes, and encoders cannot
+    shrink it to nothing"""
+    pattern = Image.frombytes("L", (16, 12), rng.randbytes(16 * 12))
+    base = pattern.resize((width, height), Image.Resampling.BILINEAR)
+    noise = Image.effect_noise((width, height), 40)
+    tint = Image.new("L", (width, height), rng.randrange(256))
+    image = Image.merge("RGB", (base, noise, tint))
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=90)
+    return buffer.getvalue()
+
+
+def generate(count, seed=0):
+    """Yield (file name, content) pairs, alternating PDFs and images of varying size"""
+    rng = random.Random(seed)
+    for index in range(count):
+        if index % 2 == 0:
+            pages = PDF_PAGES[(index // 2) % len(PDF_PAGES)]
+            yield f"download_{index:04d}_{pages}p.pdf", pdf_bytes(pages, rng)
+        else:
+            width, height = IMAGE_SIZES[(index // 2) % len(IMAGE_SIZES)]
+            yield f"download_{index:04d}_{width}x{height}.jpg", image_bytes(width, height, rng)
+
+
+def write_downloads(directory, count, seed=0):
+    """Write synthetic files into a directory and return their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, data in generate(count, seed):
+        path = os.path.join(directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = write_downloads(args.directory, args.files, args.seed)
+    print(f"Wrote {len(paths)} files to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,585 @@
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+import metrics
 import utils
+from dedup_index import ExpiringIndex
+from rule_classifier import RuleClassifier
+from similarity_index import has_image_detail, image_dhash, text_simhash
+from inference_client import InferenceClient, InferenceUnavailable
+
+logger = logging.getLogger(__name__)
+
+EMPTY_PDF = "PDF appears to be empty or contains no extractable text."
+DEFAULT_CATEGORIES = ["documents", "images", "invoices", "presentations", "spreadsheets", "misc"]
+# PDFs with extractable text take the "text" route, images the "image" route and
+# PDFs without text (scans) are rendered and take the "scanned" route
+ROUTES = ("text", "image", "scanned")
+
+
+def _user_message(content):
+    """A user chat message; LangChain is only imported once a prompt is built"""
+    from langchain_core.messages import HumanMessage
+
+    return HumanMessage(content=content)
 
 
 class AIProcessor:
     """Handles AI processing of files"""
 
-    def __init__(self, inference_host, model="qwen3-vl:2b"):
-        self.client = ChatOllama(model=model, base_url=inference_host)
+    def __init__(
+        self,
+        inference_host,
+        model="qwen3-vl:2b",
+        cache=None,
+        pdf_max_chars=4000,
+        pdf_max_pages=10,
+        pdf_strategy="first",
+        image_max_edge=1024,
+        image_format="JPEG",
+        image_quality=85,
+        image_max_pixels=None,
+        rules_threshold=0.85,
+        batch_size=8,
+        batch_concurrency=4,
+        batch_combine_pdfs=True,
+        client=None,
+        categories=None,
+        structured_output=True,
+        max_output_tokens=32,
+        similarity=None,
+        routes=None,
+        scanned_pages=2,
+        scanned_dpi=100,
+    ):
+        # Pass a shared InferenceClient to reuse one connection pool across components
+        self.client = client or InferenceClient(inference_host, model)
+        # Model per route; routes left out of the table use the default model
+        self.routes = {route: model for route in ROUTES}
+        self.routes.update(routes or {})
+        # Scans are images too, so they follow the image route unless routed themselves
+        if "scanned" not in (routes or {}):
+            self.routes["scanned"] = self.routes["image"]
+        self.cache = cache
+        self.pdf_max_chars = pdf_max_chars
+        self.pdf_max_pages = pdf_max_pages
+        self.pdf_strategy = pdf_strategy
+        self.image_max_edge = image_max_edge
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.image_max_pixels = image_max_pixels
+        self.scanned_pages = scanned_pages
+        self.scanned_dpi = scanned_dpi
+        # Prepared payloads are large, so only a handful are kept
+        self.image_cache = ExpiringIndex(max_entries=32)
+        self.rules = RuleClassifier()
+        self.rules_threshold = rules_threshold
+        # Near-duplicates of earlier files reuse their result (a SimilarityIndex)
+        self.similarity = similarity
+        # How many files each tier (cache, rules, similar, model) answered
+        self.tier_counts = Counter()
+        self.batch_size = max(1, batch_size)
+        self.batch_concurrency = batch_concurrency
+        self.batch_combine_pdfs = batch_combine_pdfs
+        # A list, or a callable returning the current list so edits to the
+        # categories file reach prompts and schemas without a restart
+        self._categories = categories
+        # Structured mode makes the model fill in a small JSON object instead of
+        # writing free text, which caps generated tokens
+        self.structured_output = structured_output
+        self.max_output_tokens = max_output_tokens
+        # Model calls, generated tokens and time spent, to measure output savings
+        self.inference_counts = Counter()
+        # Calls and seconds per route, keyed (route, "calls") and (route, "seconds")
+        self.route_counts = Counter()
+        self._stats_lock = threading.Lock()
 
-    def process_file(self, file_path):
-        """Process a file based on its type"""
-        if utils.is_image(file_path):
-            return self._process_image(file_path)
-        elif utils.is_pdf(file_path):
-            return self._process_pdf(file_path)
-        else:
-            return f"Unsupported file type: {utils.get_mime_type(file_path)}"
+    @property
+    def categories(self):
+        """Category names the model may answer with right now"""
+        categories = self._categories() if callable(self._categories) else self._categories
+        return list(categories or DEFAULT_CATEGORIES)
 
-    def _process_image(self, file_path):
-        """Process image file with AI"""
-        try:
-            image_data = utils.encode_image(file_path)
-            mime_type = utils.get_mime_type(file_path)
-
-            messages = [
-                HumanMessage(
-                    content=[
-                        {
-                            "type": "text",
-                            "text": """
-                                    Categorise this image into one of the following: documents, images,
-                                    invoices, presentations, spreadsheets, or miscellaneous
-                                    """,
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": f"data:{mime_type};base64,{image_data}",
+    def classification_schema(self):
+        """JSON schema for a single answer, limited to the current categories"""
+        return {
+            "type": "object",
+            "properties": {
+                "category": {"type": "string", "enum": self.categories},
+                "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+            },
+            "required": ["category", "confidence"],
+        }
+
+    def batch_schema(self):
+        """JSON schema for a combined answer about several documents"""
+        return {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "document": {"type": "integer"},
+                            "category": {"type": "string", "enum": self.categories},
                         },
-                    ]
+                        "required": ["document", "category"],
+                    },
+                }
+            },
+            "required": ["results"],
+        }
+
+    def warm_up(self):
+        """Load every routed model so the first file does not wait for it"""
+        for model in dict.fromkeys(self.routes.values()):
+            self.client.warm_up(model)
+
+    def sample_pdf(self, file_path):
+        """Read the text sample and metadata of a PDF in one pass"""
+        with metrics.stage("extract", file_path):
+            return utils.read_pdf_sample(
+                file_path, self.pdf_max_chars, self.pdf_max_pages, self.pdf_strategy
+            )
+
+    def _pdf_sample(self, file_path, pdf_sample):
+        """A PDF sample passed in, produced by a lazy loader, or read here"""
+        if callable(pdf_sample):
+            pdf_sample = pdf_sample()
+        if pdf_sample is None:
+            pdf_sample = self.sample_pdf(file_path)
+        return pdf_sample
+
+    def prepare_image(self, file_path):
+        """Return the downscaled base64 payload and MIME type for an image"""
+        stat_result = os.stat(file_path)
+        key = (
+            stat_result.st_dev,
+            stat_result.st_ino,
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        )
+        prepared = self.image_cache.get(key)
+        if prepared is None:
+            with metrics.stage("encode", file_path):
+                prepared = utils.prepare_image(
+                    file_path, self.image_max_edge, self.image_format, self.image_quality,
+                    self.image_max_pixels,
                 )
-            ]
+            self.image_cache.add(key, prepared)
+        return prepared
+
+    def _file_kind(self, file_path):
+        """Return "image" or "PDF" for supported files, otherwise None"""
+        if utils.is_image(file_path):
+            return "image"
+        if utils.is_pdf(file_path):
+            return "PDF"
+        return None
 
-            ai_msg = self.client.invoke(messages)
-            return ai_msg.content
+    def _answer_without_model(self, file_path, kind, file_hash, pdf_sample):
+        """Try the cache, rule and similarity tiers
+
+        Returns (result or None, pdf_sample, signature); the signature is kept
+        so a model answer can be added to the similarity index. pdf_sample may
+        be a loader; it is only called once the cache and filename rules missed.
+        """
+        # A cached result for the same content skips the model entirely
+        if self.cache is not None and file_hash:
+            cached = self.cache.get(file_hash)
+            if cached is not None:
+                self._count_tier("cache")
+                return cached["result"], pdf_sample, None
+
+        # Confident heuristics also skip the model; the file name alone is tried
+        # first so a PDF it settles is never read
+        if kind == "PDF" and not isinstance(pdf_sample, dict):
+            category = self._rules_answer(file_path, None)
+            if category is not None:
+                return category, None, None
+            pdf_sample = self._pdf_sample(file_path, pdf_sample)
+        category = self._rules_answer(file_path, pdf_sample)
+        if category is not None:
+            return category, pdf_sample, None
+
+        # A re-saved photo or regenerated PDF inherits the earlier file's result
+        signature = self._signature(file_path, kind, pdf_sample)
+        if signature is not None:
+            similar = self.similarity.lookup(*signature)
+            if similar is not None:
+                logger.debug("%s is a near-duplicate (distance %d) of content %s",
+                             file_path, similar["distance"], similar["hash"])
+                self._count_tier("similar")
+                self._cache_result({"hash": file_hash}, similar["result"])
+                return similar["result"], pdf_sample, signature
+
+        return None, pdf_sample, signature
+
+    def _rules_answer(self, file_path, pdf_sample):
+        """The rule classifier's category if it is confident enough, otherwise None"""
+        category, confidence, reasons = self.rules.classify(file_path, pdf_sample)
+        if category is None or confidence < self.rules_threshold:
+            return None
+        logger.debug("Rules classified %s as %s (%.2f): %s",
+                     file_path, category, confidence, "; ".join(reasons))
+        self._count_tier("rules")
+        return category
+
+    def _signature(self, file_path, kind, pdf_sample):
+        """("image", perceptual hash) or ("text", SimHash) for the similarity index, or None"""
+        if self.similarity is None:
+            return None
+        try:
+            with metrics.stage("signature", file_path):
+                if kind == "image":
+                    signature = image_dhash(file_path, max_pixels=self.image_max_pixels)
+                    return ("image", signature) if has_image_detail(signature) else None
+                signature = text_simhash(pdf_sample["text"])
+                return ("text", signature) if signature is not None else None
+        except utils.ImageTooLarge:
+            raise
         except Exception as e:
-            return f"Error processing image: {str(e)}"
+            logger.debug("No similarity signature for %s: %s", file_path, e)
+            return None
+
+    def process_file(self, file_path, file_hash=None, pdf_sample=None, image=None):
+        """Process a file based on its type
+
+        pdf_sample and image (a (base64, MIME type) pair from utils.prepare_image)
+        may be passed in when they were already prepared elsewhere; pdf_sample
+        may also be a callable that reads it only if it is needed. Images too
+        large to decode raise utils.ImageTooLarge rather than being classified.
+        """
+        kind = self._file_kind(file_path)
+        if kind is None:
+            return f"Unsupported file type: {utils.get_mime_type(file_path)}"
 
-    def _process_pdf(self, file_path):
-        """Process PDF file with AI"""
         try:
-            # Extract text from PDF
-            pdf_text = utils.extract_text_from_pdf(file_path)
-
-            if not pdf_text.strip():
-                return "PDF appears to be empty or contains no extractable text."
-
-            # Limit text length to avoid context window issues
-            if len(pdf_text) > 4000:
-                pdf_text = pdf_text[:4000] + "...[truncated]"
-
-            messages = [
-                HumanMessage(
-                    content=[
-                        {
-                            "type": "text",
-                            "text": f"""
-                                    Analyze this PDF content and categorise it into one of the following:
-                                    documents, images, invoices, presentations, spreadsheets, or miscellaneous
-                                    Only return the singular word for the category - no need to show analysis
-
-                                    {pdf_text}
-                                    """,
-                        }
-                    ]
-                )
-            ]
+            result, pdf_sample, signature = self._answer_without_model(
+                file_path, kind, file_hash, pdf_sample)
+            if result is not None:
+                return result
+
+            self._count_tier("model")
+            if kind == "image":
+                result = self._process_image(file_path, image)
+            else:
+                result = self._process_pdf(file_path, pdf_sample)
+        except (InferenceUnavailable, utils.ImageTooLarge):
+            # Let the caller queue the file for later, or leave it in place
+            raise
+        except Exception as e:
+            return f"Error processing {kind}: {str(e)}"
+
+        self._cache_result({"hash": file_hash}, result, signature)
+        return result
+
+    def process_batch(self, files):
+        """Process several files with as few model round trips as possible
+
+        Each entry is a dict with "path" and optionally "hash" and "pdf_sample"
+        (a sample or a loader, as for process_file). Results are returned in
+        the same order as the input. A result is None
+        when the model host was unavailable and the file should be retried later,
+        and a utils.ImageTooLarge error for an image refused before decoding.
+        """
+        results = [None] * len(files)
+        pending = []  # (index, route, messages) still needing the model
+        signatures = {}  # index -> similarity signature of files that may reach the model
+        pdf_group = []  # (index, pdf_sample) that can share one combined prompt
 
-            ai_msg = self.client.invoke(messages)
-            return ai_msg.content
+        for index, file_info in enumerate(files):
+            file_path = file_info["path"]
+            kind = self._file_kind(file_path)
+            if kind is None:
+                results[index] = f"Unsupported file type: {utils.get_mime_type(file_path)}"
+                continue
+
+            try:
+                result, pdf_sample, signatures[index] = self._answer_without_model(
+                    file_path, kind, file_info.get("hash"), file_info.get("pdf_sample"))
+                if result is not None:
+                    results[index] = result
+                elif kind == "image":
+                    pending.append((index, "image", self._image_messages(file_path)))
+                elif not pdf_sample["text"].strip():
+                    messages = self._scanned_pdf_messages(file_path)
+                    if messages is None:
+                        results[index] = EMPTY_PDF
+                    else:
+                        pending.append((index, "scanned", messages))
+                elif self.batch_combine_pdfs:
+                    pdf_group.append((index, pdf_sample))
+                else:
+                    pending.append((index, "text", self._pdf_messages(pdf_sample)))
+            except utils.ImageTooLarge as e:
+                results[index] = e
+            except Exception as e:
+                results[index] = f"Error processing {kind}: {str(e)}"
+
+        for start in range(0, len(pdf_group), self.batch_size):
+            group = pdf_group[start:start + self.batch_size]
+            if len(group) > 1:
+                for index, result in self._classify_pdfs_together(group).items():
+                    results[index] = result
+                    self._cache_result(files[index], result, signatures.get(index))
+            # Anything the combined answer did not cover is asked about on its own
+            for index, pdf_sample in group:
+                if results[index] is None:
+                    pending.append((index, "text", self._pdf_messages(pdf_sample)))
+
+        for route in ROUTES:
+            requests = [(index, messages) for index, request_route, messages in pending
+                        if request_route == route]
+            if not requests:
+                continue
+            self._count_tier("model", len(requests))
+            started = time.perf_counter()
+            responses = self.client.batch(
+                [messages for _, messages in requests],
+                config={"max_concurrency": self.batch_concurrency},
+                return_exceptions=True,
+                **self._invoke_kwargs(self.classification_schema(), self.max_output_tokens, route),
+            )
+            elapsed = (time.perf_counter() - started) / len(requests)
+            for (index, _), response in zip(requests, responses):
+                if isinstance(response, InferenceUnavailable):
+                    results[index] = None
+                elif isinstance(response, Exception):
+                    kind = self._file_kind(files[index]["path"])
+                    results[index] = f"Error processing {kind}: {str(response)}"
+                else:
+                    self._record_inference(response, elapsed, route)
+                    results[index] = self._parse_category(response.content)
+                    self._cache_result(files[index], results[index], signatures.get(index))
+
+        return results
+
+    def _cache_result(self, file_info, result, signature=None):
+        """Store a model result for the file's content hash and similarity signature"""
+        if self.cache is not None and file_info.get("hash"):
+            self.cache.put(file_info["hash"], result)
+        if signature is not None and self.similarity is not None:
+            self.similarity.add(*signature, file_info.get("hash"), result)
+
+    def _classify_pdfs_together(self, group):
+        """Classify several PDF excerpts in one prompt, returning {index: category}"""
+        # The group shares the single-file text budget so the prompt stays in context
+        excerpt_chars = max(500, self.pdf_max_chars // len(group))
+        excerpts = "\n\n".join(
+            f"Document {number}:\n{pdf_sample['text'][:excerpt_chars]}"
+            for number, (_, pdf_sample) in enumerate(group, start=1)
+        )
+        if self.structured_output:
+            answer_format = 'Answer with JSON: {"results": [{"document": <number>, "category": <category>}]}'
+        else:
+            answer_format = 'Answer with one line per document in the form "<number>: <category>"'
+        messages = [
+            _user_message(
+                content=f"""
+                        Categorise each of the following documents into one of: {self._category_list()}.
+                        {answer_format}
+                        and nothing else.
+
+                        {excerpts}
+                        """
+            )
+        ]
+
+        try:
+            content = self._invoke(
+                messages, "text", self.batch_schema(), self.max_output_tokens * len(group))
         except Exception as e:
-            return f"Error processing PDF: {str(e)}"
+            logger.warning("Combined PDF classification failed: %s", e)
+            return {}
+
+        pairs = []
+        try:
+            pairs = [(item["document"], item["category"])
+                     for item in json.loads(content)["results"]]
+        except (ValueError, KeyError, TypeError):
+            # Free-text answers (or malformed JSON) are read line by line
+            pairs = re.findall(r"^\W*(\d+)\W+([A-Za-z]+)", content, re.M)
+
+        answers = {}
+        for number, category in pairs:
+            position = int(number) - 1
+            if 0 <= position < len(group):
+                answers[group[position][0]] = str(category).lower()
+        # Documents left unanswered are counted when they are asked about on their own
+        self._count_tier("model", len(answers))
+        return answers
+
+    def _count_tier(self, tier, count=1):
+        """Record which tier answered a file"""
+        with self._stats_lock:
+            self.tier_counts[tier] += count
+        metrics.inc("declutter_tier_files_total", count, tier=tier)
+
+    def tier_stats(self):
+        """Files answered per tier and how many model calls were avoided"""
+        with self._stats_lock:
+            stats = dict(self.tier_counts)
+        stats["model_calls_avoided"] = (
+            stats.get("cache", 0) + stats.get("rules", 0) + stats.get("similar", 0))
+        return stats
+
+    def inference_stats(self):
+        """Model calls, generated tokens and average time per call"""
+        with self._stats_lock:
+            counts = dict(self.inference_counts)
+        calls = counts.get("calls", 0)
+        return {
+            "calls": calls,
+            "output_tokens": counts.get("output_tokens", 0),
+            "output_tokens_per_call": counts.get("output_tokens", 0) / calls if calls else 0.0,
+            "seconds_per_call": counts.get("seconds", 0.0) / calls if calls else 0.0,
+        }
+
+    def route_stats(self):
+        """Model, calls and average seconds per call for each route"""
+        with self._stats_lock:
+            counts = dict(self.route_counts)
+        stats = {}
+        for route, model in self.routes.items():
+            calls = counts.get((route, "calls"), 0)
+            stats[route] = {
+                "model": model,
+                "calls": calls,
+                "seconds_per_call": counts.get((route, "seconds"), 0.0) / calls if calls else 0.0,
+            }
+        return stats
+
+    def _record_inference(self, response, elapsed, route):
+        """Add one model response to the inference and route statistics"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        with self._stats_lock:
+            self.inference_counts["calls"] += 1
+            self.inference_counts["output_tokens"] += usage.get("output_tokens", 0)
+            self.inference_counts["seconds"] += elapsed
+            self.route_counts[(route, "calls")] += 1
+            self.route_counts[(route, "seconds")] += elapsed
+        metrics.record_stage("inference", elapsed)
+        metrics.observe("declutter_route_seconds", elapsed, route=route, model=self.routes[route])
+        metrics.inc("declutter_inference_output_tokens_total", usage.get("output_tokens", 0))
+
+    def _invoke_kwargs(self, schema, max_tokens, route):
+        """Model and, in structured mode, output parameters for a request"""
+        kwargs = {"model": self.routes[route]}
+        if self.structured_output:
+            kwargs["format"] = schema
+            kwargs["options"] = {"num_predict": max_tokens, "temperature": 0}
+        return kwargs
+
+    def _invoke(self, messages, route, schema=None, max_tokens=None):
+        """Call the route's model and return the response text"""
+        schema = schema or self.classification_schema()
+        started = time.perf_counter()
+        ai_msg = self.client.invoke(
+            messages,
+            **self._invoke_kwargs(schema, max_tokens or self.max_output_tokens, route))
+        self._record_inference(ai_msg, time.perf_counter() - started, route)
+        return ai_msg.content
+
+    def _parse_category(self, content):
+        """Take the category from a structured answer, or return free text for keyword matching"""
+        if self.structured_output:
+            try:
+                answer = json.loads(content)
+                category = str(answer["category"]).lower()
+                if category in self.categories:
+                    return category
+            except (ValueError, KeyError, TypeError):
+                pass
+        return content
+
+    def _category_list(self):
+        """Categories formatted for a prompt, e.g. 'a, b, or c'"""
+        categories = self.categories
+        return ", ".join(categories[:-1]) + f", or {categories[-1]}"
+
+    def _answer_instruction(self):
+        """How the model should phrase its answer"""
+        if self.structured_output:
+            return 'Respond only with JSON: {"category": <category>, "confidence": <0-1>}'
+        return "Only return the singular word for the category - no need to show analysis"
+
+    def _image_messages(self, file_path, image=None, subject="image"):
+        """Build the model prompt for an image"""
+        image_data, mime_type = image or self.prepare_image(file_path)
+
+        return [
+            _user_message(
+                content=[
+                    {
+                        "type": "text",
+                        "text": f"""
+                                Categorise this {subject} into one of the following:
+                                {self._category_list()}
+                                {self._answer_instruction()}
+                                """,
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": f"data:{mime_type};base64,{image_data}",
+                    },
+                ]
+            )
+        ]
+
+    def _scanned_pdf_messages(self, file_path):
+        """Build the vision prompt for a PDF without text from its first pages, or None"""
+        with metrics.stage("render", file_path):
+            image = utils.render_pdf_pages(
+                file_path, self.scanned_pages, self.image_max_edge, self.scanned_dpi,
+                self.image_format, self.image_quality)
+        if image is None:
+            return None
+        return self._image_messages(file_path, image, "scanned document")
+
+    def _pdf_messages(self, pdf_sample):
+        """Build the model prompt for a PDF text sample"""
+        pdf_text = pdf_sample["text"]
+        if pdf_sample["truncated"]:
+            pdf_text += "...[truncated]"
+
+        return [
+            _user_message(
+                content=[
+                    {
+                        "type": "text",
+                        "text": f"""
+                                Analyze this PDF content and categorise it into one of the following:
+                                {self._category_list()}
+                                {self._answer_instruction()}
+
+                                {pdf_text}
+                                """,
+                    }
+                ]
+            )
+        ]
+
+    def _process_image(self, file_path, image=None):
+        """Process image file with AI"""
+        return self._parse_category(
+            self._invoke(self._image_messages(file_path, image), "image"))
+
+    def _process_pdf(self, file_path, pdf_sample=None):
+        """Process PDF file with AI"""
+        # Extract a bounded text sample; the budget keeps us within the context window
+        pdf_sample = self._pdf_sample(file_path, pdf_sample)
+
+        if not pdf_sample["text"].strip():
+            # Most likely a scan; classify a rendering of its first pages instead
+            messages = self._scanned_pdf_messages(file_path)
+            if messages is None:
+                return EMPTY_PDF
+            return self._parse_category(self._invoke(messages, "scanned"))
+
+        return self._parse_category(self._invoke(self._pdf_messages(pdf_sample), "text"))
@@ -0,0 +1,204 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class FileIndex:
+    """Persistent record of files already handled, keyed by path"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_index (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                handled REAL NOT NULL
+            )
+            """
+        )
+
+    def load_directory(self, directory):
+        """Return {path: (size, mtime_ns, hash)} for every record under a directory"""
+        prefix = os.path.join(os.fspath(directory), "")
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, hash FROM file_index WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+        return {path: (size, mtime_ns, file_hash) for path, size, mtime_ns, file_hash in rows}
+
+    def record(self, path, size, mtime_ns, file_hash=None):
+        """Remember that a file version has been handled"""
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO file_index (path, size, mtime_ns, hash, handled)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size = excluded.size, mtime_ns = excluded.mtime_ns,
+                    hash = excluded.hash, handled = excluded.handled
+                """,
+                (os.fspath(path), size, mtime_ns, file_hash, time.time()),
+            )
+
+    def record_file(self, file_info):
+        """Record a file_info dict, reading size and mtime from disk if it still exists"""
+        path = file_info["path"]
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            # The file was organized away; nothing is left to skip on the next scan
+            self.forget([path])
+            return
+        self.record(path, stat_result.st_size, stat_result.st_mtime_ns, file_info.get("hash"))
+
+    def forget(self, paths):
+        """Drop records for paths that no longer exist"""
+        with self._lock:
+            self.conn.executemany(
+                "DELETE FROM file_index WHERE path = ?", [(os.fspath(p),) for p in paths])
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class RateLimiter:
+    """Token bucket limiting how many files per second are released"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait(self):
+        """Block until a token is available"""
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            time.sleep((1 - self.tokens) / self.rate)
+
+
+class BacklogScanner:
+    """Finds files that appeared while the daemon was not watching
+
+    With watch roots, each file is tagged with the root that owns it (the
+    longest match), and a file owned by a nested root is left to that root's
+    own scan so it is not submitted twice.
+    """
+
+    def __init__(self, index, submit, hash_cache, rate=2.0, ignore=None, watch_roots=None):
+        self.index = index
+        self.submit = submit
+        self.hash_cache = hash_cache
+        self.limiter = RateLimiter(rate)
+        self.ignore = ignore
+        self.watch_roots = watch_roots
+
+    def scan(self, directory, recursive=False):
+        """Submit new or changed files under a directory, returning how many were queued"""
+        directory = os.path.normpath(os.fspath(directory))
+        known = self.index.load_directory(directory)
+        seen = set()
+        queued = 0
+
+        for entry in self._iter_files(directory, recursive):
+            path = entry.path
+            seen.add(path)
+            if self.ignore is not None and self.ignore(path):
+                continue
+            root = directory
+            if self.watch_roots is not None:
+                owner = self.watch_roots.root_for(path)
+                if owner is not None:
+                    root = owner.path
+            if root != directory:
+                continue  # scanned with the nested root that owns it
+            try:
+                stat_result = entry.stat()
+            except FileNotFoundError:
+                continue
+            if stat_result.st_size == 0:
+                continue
+
+            # Unchanged size and mtime means the file was already handled; no read needed
+            record = known.get(path)
+            if record is not None and record[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+                continue
+
+            try:
+                file_hash = self.hash_cache.get(path, stat_result)
+            except Exception as e:
+                logger.warning("Could not hash backlog file %s: %s", path, e)
+                continue
+
+            # Touched but identical content only needs its record refreshed
+            if record is not None and record[2] == file_hash:
+                self.index.record(path, stat_result.st_size, stat_result.st_mtime_ns, file_hash)
+                continue
+
+            self.limiter.wait()
+            self.submit({
+                'path': path,
+                'name': entry.name,
+                'extension': Path(path).suffix.lower(),
+                'size': stat_result.st_size,
+                'mtime': stat_result.st_mtime,
+                'hash': file_hash,
+                'root': directory,
+                'detected': time.monotonic(),
+            })
+            queued += 1
+
+        # Records for files that are gone would only slow down the next scan
+        missing = [
+            path for path in known
+            if path not in seen and (recursive or os.path.dirname(path) == directory)
+        ]
+        if missing:
+            self.index.forget(missing)
+        return queued
+
+    def _iter_files(self, directory, recursive):
+        return iter_files(directory, recursive)
+
+
+def iter_files(directory, recursive=False, skip_dirs=()):
+    """Yield DirEntry objects for regular files, lazily, without descending into skip_dirs"""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            yield entry
+                        elif (recursive and entry.is_dir(follow_symlinks=False)
+                              and entry.path not in skip_dirs):
+                            stack.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning("Could not scan %s: %s", current, e)
@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import metrics
+
+
+class ClassificationCache:
+    """Persistent SQLite store mapping content hashes to AI results and categories"""
+
+    def __init__(self, db_path, max_entries=50000, max_age_days=90):
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_prune = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classifications (
+                hash TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                category TEXT,
+                file_size INTEGER,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS classifications_created ON classifications(created)"
+        )
+        self.prune()
+
+    def get(self, file_hash):
+        """Return the cached entry for a content hash, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT result, category, created FROM classifications WHERE hash = ?",
+                (file_hash,),
+            ).fetchone()
+            if row is None or time.time() - row[2] > self.max_age:
+                self.misses += 1
+                metrics.inc("declutter_cache_requests_total", cache="classification", result="miss")
+                return None
+            self.hits += 1
+        metrics.inc("declutter_cache_requests_total", cache="classification", result="hit")
+        return {"result": row[0], "category": row[1]}
+
+    def put(self, file_hash, result, file_size=None):
+        """Store the AI result for a content hash"""
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO classifications (hash, result, file_size, created)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET
+                    result = excluded.result, created = excluded.created
+                """,
+                (file_hash, result, file_size, time.time()),
+            )
+            self._puts_since_prune += 1
+            prune_due = self._puts_since_prune >= 100
+        if prune_due:
+            self.prune()
+
+    def set_category(self, file_hash, category):
+        """Record the category the organizer chose for a content hash"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE classifications SET category = ? WHERE hash = ?",
+                (category, file_hash),
+            )
+
+    def prune(self):
+        """Drop expired entries and keep at most max_entries of the newest"""
+        with self._lock:
+            self._puts_since_prune = 0
+            self.conn.execute(
+                "DELETE FROM classifications WHERE created < ?",
+                (time.time() - self.max_age,),
+            )
+            self.conn.execute(
+                """
+                DELETE FROM classifications WHERE hash IN (
+                    SELECT hash FROM classifications
+                    ORDER BY created DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        """Hit and miss counts since startup"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
+
@@ -0,0 +1,350 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+# Add src directory to path for imports (also in pool worker processes)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils  # noqa: E402
+from backlog import FileIndex, iter_files  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_file(path, settings):
+    """Hash a file and extract its PDF sample or encoded image, in a pool worker process"""
+    file_info = {
+        "path": path,
+        "name": os.path.basename(path),
+        "extension": Path(path).suffix.lower(),
+        "pdf_sample": None,
+        "image": None,
+        "error": None,
+    }
+    try:
+        stat_result = os.stat(path)
+        file_info["size"] = stat_result.st_size
+        file_info["mtime_ns"] = stat_result.st_mtime_ns
+        file_info["hash"] = utils.get_file_hash(path, settings["hash_algorithm"])
+        if utils.is_pdf(path):
+            file_info["pdf_sample"] = utils.read_pdf_sample(
+                path, settings["pdf_max_chars"], settings["pdf_max_pages"],
+                settings["pdf_strategy"])
+        elif utils.is_image(path):
+            file_info["image"] = utils.prepare_image(
+                path, settings["image_max_edge"], settings["image_format"],
+                settings["image_quality"], settings["image_max_pixels"])
+    except Exception as e:
+        file_info["error"] = str(e)
+    return file_info
+
+
+def bounded_imap(executor, function, items, limit):
+    """Like executor.map with at most limit calls in flight, yielding results as they finish"""
+    pending = set()
+    for item in items:
+        pending.add(executor.submit(function, item))
+        if len(pending) >= limit:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+class PlanWriter:
+    """Appends planned moves to a JSON-lines file, remembering paths already planned"""
+
+    def __init__(self, path):
+        self.path = path
+        self.planned = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.planned.add(json.loads(line)["path"])
+                    except (ValueError, KeyError):
+                        continue  # a line cut short by an interrupted run
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class BatchOrganizer:
+    """Organizes an existing directory tree once, resuming where an earlier run stopped
+
+    Hashing and PDF/image preparation run in a process pool; model calls and
+    moves run on a separate, smaller thread pool so inference concurrency is
+    capped independently of CPU work. Organized files leave the tree and files
+    that could not be moved are recorded in the FileIndex, so a rerun only
+    picks up what is left; a dry run resumes from the paths already in its plan.
+    """
+
+    def __init__(
+        self,
+        ai_processor,
+        organizer,
+        file_index,
+        settings,
+        workers=None,
+        inference_concurrency=4,
+        plan=None,
+        retry_delay=30,
+        max_retries=3,
+    ):
+        self.ai_processor = ai_processor
+        self.organizer = organizer
+        self.file_index = file_index
+        self.settings = settings
+        self.workers = workers or os.cpu_count() or 1
+        self.inference_concurrency = max(1, inference_concurrency)
+        self.plan = plan
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.counts = Counter()
+
+    def candidates(self, directory, recursive):
+        """Supported files not handled by an earlier run, streamed from disk"""
+        directory = os.path.abspath(directory)
+        known = self.file_index.load_directory(directory)
+        output_dir = os.path.abspath(self.organizer.organization_base_dir)
+        for entry in iter_files(directory, recursive, skip_dirs={output_dir}):
+            path = entry.path
+            if not (utils.is_pdf(path) or utils.is_image(path)):
+                self.counts["unsupported"] += 1
+                continue
+            if self.plan is not None and path in self.plan.planned:
+                self.counts["already_planned"] += 1
+                continue
+            try:
+                stat_result = entry.stat()
+            except FileNotFoundError:
+                continue
+            record = known.get(path)
+            if record is not None and record[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+                self.counts["already_done"] += 1
+                continue
+            yield path
+
+    def run(self, directory, recursive=True):
+        """Organize (or plan) every candidate under directory, returning the status counts"""
+        started = time.monotonic()
+        handled = 0
+        with ProcessPoolExecutor(self.workers) as processes, \
+                ThreadPoolExecutor(self.inference_concurrency) as threads:
+            prepared = bounded_imap(
+                processes,
+                _PrepareCall(self.settings),
+                self.candidates(directory, recursive),
+                self.workers * 4,
+            )
+            try:
+                for status in bounded_imap(
+                        threads, self.handle, prepared, self.inference_concurrency * 2):
+                    self.counts[status] += 1
+                    handled += 1
+                    if handled % 100 == 0:
+                        logger.info("%d files handled (%.1f files/s)", handled,
+                                    handled / (time.monotonic() - started))
+            except KeyboardInterrupt:
+                logger.warning("Interrupted; rerun the same command to resume")
+                processes.shutdown(wait=False, cancel_futures=True)
+                threads.shutdown(wait=False, cancel_futures=True)
+                raise
+        return self.counts
+
+    def handle(self, file_info):
+        """Classify one prepared file, then move it or add it to the plan"""
+        path = file_info["path"]
+        if file_info["error"] is not None:
+            logger.warning("Could not read %s: %s", path, file_info["error"])
+            return "error"
+
+        result = self._classify(file_info)
+        if result is None:
+            return "unavailable"  # not recorded, so the next run retries it
+
+        if self.plan is not None:
+            category = self.organizer.determine_category(result)
+            self.plan.write({
+                "path": path,
+                "category": category,
+                "target": str(self.organizer.organization_base_dir / category / file_info["name"]),
+                "hash": file_info["hash"],
+                "size": file_info["size"],
+            })
+            return "planned"
+
+        organization_result = self.organizer.organize_file(path, result)
+        if organization_result["status"] != "success":
+            self.file_index.record(path, file_info["size"], file_info["mtime_ns"], file_info["hash"])
+            return "failed"
+        if self.ai_processor.cache is not None:
+            self.ai_processor.cache.set_category(
+                file_info["hash"], organization_result["category"])
+        return "organized"
+
+    def _classify(self, file_info):
+        """Run the AI tiers, waiting out an unavailable model host a few times"""
+        from inference_client import InferenceUnavailable
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.ai_processor.process_file(
+                    file_info["path"], file_info["hash"], file_info["pdf_sample"],
+                    file_info["image"])
+            except InferenceUnavailable as e:
+                if attempt == self.max_retries:
+                    logger.warning("Inference unavailable, leaving %s for the next run: %s",
+                                   file_info["path"], e)
+                    return None
+                time.sleep(self.retry_delay)
+
+
+class _PrepareCall:
+    """Picklable prepare_file call with fixed settings, for the process pool"""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def __call__(self, path):
+        return prepare_file(path, self.settings)
+
+
+def main(argv=None):
+    """Entry point for `python src/main.py organize <dir>`"""
+    import main as config
+    from ai_processor import AIProcessor
+    from classification_cache import ClassificationCache
+    from file_organizer import FileOrganizerAgent
+    from inference_client import InferenceClient
+    from logging_setup import configure_logging
+    from similarity_index import SimilarityIndex
+
+    parser = argparse.ArgumentParser(
+        prog="declutter organize",
+        description="Organize an existing directory tree once, then exit",
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--output", default=config.ORGANIZATION_BASE_DIR,
+                        help="base directory for organized files (ORGANIZATION_BASE_DIR)")
+    parser.add_argument("--no-recursive", dest="recursive", action="store_false",
+                        help="only organize files directly inside the directory")
+    parser.add_argument("--dry-run", metavar="PLAN",
+                        help="write planned moves to this JSON-lines file instead of moving")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes for hashing and extraction")
+    parser.add_argument("--inference-concurrency", type=int, default=config.BATCH_CONCURRENCY,
+                        help="model requests in flight at once")
+    args = parser.parse_args(argv)
+
+    configure_logging(config.LOG_LEVEL, config.LOG_FORMAT)
+    if not config.INFERENCE_HOST:
+        logger.error("INFERENCE_HOST not set in environment variables")
+        return 1
+    if not args.output:
+        logger.error("Set ORGANIZATION_BASE_DIR or pass --output")
+        return 1
+
+    classification_cache = ClassificationCache(
+        config.CACHE_DB_PATH, config.CACHE_MAX_ENTRIES, config.CACHE_MAX_AGE_DAYS)
+    file_index = FileIndex(config.CACHE_DB_PATH)
+    similarity_index = None
+    if config.SIMILARITY_DEDUP:
+        similarity_index = SimilarityIndex(
+            config.CACHE_DB_PATH, config.SIMILARITY_MAX_DISTANCE,
+            config.SIMILARITY_MEMORY_ENTRIES, config.CACHE_MAX_ENTRIES)
+    organizer = FileOrganizerAgent(
+        args.output, config.CATEGORIES_PATH, create_directories=not args.dry_run)
+    inference_client = InferenceClient(
+        config.INFERENCE_HOST,
+        config.INFERENCE_MODEL,
+        timeout=config.INFERENCE_TIMEOUT,
+        max_retries=config.INFERENCE_RETRIES,
+        max_connections=max(args.inference_concurrency, config.INFERENCE_MAX_CONNECTIONS),
+        failure_threshold=config.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=config.CIRCUIT_RESET_TIMEOUT,
+        keep_alive=config.MODEL_KEEP_ALIVE,
+    )
+    ai_processor = AIProcessor(
+        config.INFERENCE_HOST,
+        config.INFERENCE_MODEL,
+        cache=classification_cache,
+        pdf_max_chars=config.PDF_MAX_CHARS,
+        pdf_max_pages=config.PDF_MAX_PAGES,
+        pdf_strategy=config.PDF_SAMPLE_STRATEGY,
+        image_max_edge=config.IMAGE_MAX_EDGE,
+        image_format=config.IMAGE_FORMAT,
+        image_quality=config.IMAGE_QUALITY,
+        image_max_pixels=config.IMAGE_MAX_PIXELS,
+        rules_threshold=config.RULES_CONFIDENCE_THRESHOLD,
+        client=inference_client,
+        categories=organizer.current_categories,
+        structured_output=config.STRUCTURED_OUTPUT,
+        max_output_tokens=config.MAX_OUTPUT_TOKENS,
+        similarity=similarity_index,
+        routes=config.MODEL_ROUTES,
+        scanned_pages=config.SCANNED_PDF_PAGES,
+        scanned_dpi=config.SCANNED_PDF_DPI,
+    )
+    if config.MODEL_WARM_UP:
+        ai_processor.warm_up()
+    settings = {
+        "hash_algorithm": config.HASH_ALGORITHM,
+        "pdf_max_chars": config.PDF_MAX_CHARS,
+        "pdf_max_pages": config.PDF_MAX_PAGES,
+        "pdf_strategy": config.PDF_SAMPLE_STRATEGY,
+        "image_max_edge": config.IMAGE_MAX_EDGE,
+        "image_format": config.IMAGE_FORMAT,
+        "image_quality": config.IMAGE_QUALITY,
+        "image_max_pixels": config.IMAGE_MAX_PIXELS,
+    }
+    plan = PlanWriter(args.dry_run) if args.dry_run else None
+
+    batch = BatchOrganizer(
+        ai_processor,
+        organizer,
+        file_index,
+        settings,
+        workers=args.workers,
+        inference_concurrency=args.inference_concurrency,
+        plan=plan,
+        retry_delay=config.CIRCUIT_RESET_TIMEOUT,
+    )
+    started = time.monotonic()
+    try:
+        counts = batch.run(args.directory, args.recursive)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if plan is not None:
+            plan.close()
+        classification_cache.close()
+        file_index.close()
+        if similarity_index is not None:
+            similarity_index.close()
+    elapsed = time.monotonic() - started
+    logger.info("Done in %.1fs: %s", elapsed, dict(counts))
+    logger.info("Files answered per tier: %s", ai_processor.tier_stats())
+    for route, route_stats in ai_processor.route_stats().items():
+        logger.info("Route %s (%s): %d calls, %.2fs per call", route, route_stats['model'],
+                    route_stats['calls'], route_stats['seconds_per_call'])
+    return 0
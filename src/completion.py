@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from dedup_index import ExpiringIndex
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingFile:
+    """Write activity seen for one path that has not settled yet"""
+
+    __slots__ = ("deadline", "scheduled", "first_seen", "last_stat", "closed", "events")
+
+    def __init__(self, deadline, first_seen):
+        self.deadline = deadline
+        self.scheduled = None  # deadline of the path's live heap entry
+        self.first_seen = first_seen
+        self.last_stat = None
+        self.closed = False
+        self.events = 0
+
+
+class CompletionDetector:
+    """Debounces write events per path and reports each file once it stops changing
+
+    Every event pushes the path's deadline back by quiet_period. When a deadline
+    passes, the file is stat'ed; it completes once two checks see the same size
+    and mtime, or after one check if the writer closed it or renamed it into
+    place. All deadlines live on one heap served by a single timer thread, so
+    idle paths cost nothing.
+
+    Events are folded per path before any stat: a later deadline only updates
+    the path's state, and its heap entry is moved when it comes due, so a burst
+    of events costs one heap entry and one check. A file version already
+    reported under another path (same device, inode, size and mtime) is a
+    rename and is not reported again.
+    """
+
+    def __init__(self, on_complete, quiet_period=2.0, max_pending_age=300, rename_window=0.25):
+        self.on_complete = on_complete
+        self.quiet_period = quiet_period
+        self.max_pending_age = max_pending_age
+        # A rename chain (a -> b -> c) settles within this window before the one check
+        self.rename_window = rename_window
+        self._pending = {}
+        self._heap = []  # (deadline, sequence, path); stale entries are skipped lazily
+        self._sequence = itertools.count()
+        # File versions already reported, with their path, so late events and
+        # renames do not report them again
+        self._completed = ExpiringIndex(max_entries=4096, ttl=max_pending_age)
+        self.events = 0
+        self.checks = 0
+        self.renames = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Start the timer thread"""
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="declutter-completion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the timer thread, dropping files that have not settled"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def touch(self, path):
+        """Record write activity on a path, restarting its quiet period"""
+        now = time.monotonic()
+        with self._condition:
+            self.events += 1
+            pending = self._pending.get(path)
+            if pending is None:
+                pending = _PendingFile(now + self.quiet_period, now)
+                self._pending[path] = pending
+                self._schedule(path, pending)
+            else:
+                # The existing heap entry is moved once it comes due
+                pending.deadline = now + self.quiet_period
+                pending.closed = False
+            pending.events += 1
+
+    def closed(self, path):
+        """Record that the writer closed a path, so it can be checked right away"""
+        with self._condition:
+            self.events += 1
+            pending = self._pending.get(path)
+            if pending is None:
+                return False
+            pending.events += 1
+            pending.closed = True
+            pending.deadline = time.monotonic()
+            self._schedule(path, pending)
+            return True
+
+    def rename(self, src_path, dest_path):
+        """Follow a rename to its new name
+
+        A file still being written keeps its progress. Anything else was
+        complete when it was renamed into place (a finished .crdownload, a sync
+        tool's temporary file), so it is checked once after rename_window.
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.events += 1
+            pending = self._pending.pop(src_path, None)
+            if pending is None:
+                pending = self._pending.get(dest_path)
+                if pending is None:
+                    pending = _PendingFile(now + self.rename_window, now)
+                    self._pending[dest_path] = pending
+                pending.closed = True
+                pending.deadline = now + self.rename_window
+            else:
+                self._pending[dest_path] = pending
+            pending.events += 1
+            self._schedule(dest_path, pending)
+
+    def discard(self, path):
+        """Stop tracking a path, e.g. because it was deleted"""
+        with self._condition:
+            self._pending.pop(path, None)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def stats(self):
+        """Events received, stat checks made and renames of reported files since startup"""
+        return {"events": self.events, "checks": self.checks, "renames": self.renames}
+
+    def _schedule(self, path, pending):
+        """Push a heap entry for the path's deadline, superseding any earlier one"""
+        pending.scheduled = pending.deadline
+        heapq.heappush(self._heap, (pending.deadline, next(self._sequence), path))
+        self._condition.notify()
+
+    def _run(self):
+        """Timer loop: sleep until the next deadline and check the files that are due"""
+        while True:
+            with self._condition:
+                while self._running:
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                        self._condition.wait(timeout)
+                    else:
+                        self._condition.wait()
+                if not self._running:
+                    return
+                deadline, _, path = heapq.heappop(self._heap)
+                pending = self._pending.get(path)
+                if pending is None or pending.scheduled != deadline:
+                    continue  # superseded by a newer entry or no longer tracked
+                if pending.deadline > deadline:
+                    # Events since pushed the deadline back; wait for the new one
+                    self._schedule(path, pending)
+                    continue
+                self.checks += 1
+
+            self._check(path, pending, deadline)
+
+    def _check(self, path, pending, deadline):
+        """Stat a due path and either complete it or wait another quiet period"""
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            self.discard(path)
+            return
+
+        now = time.monotonic()
+        version = (stat_result.st_size, stat_result.st_mtime_ns)
+        with self._condition:
+            if self._pending.get(path) is not pending:
+                return  # renamed or deleted while we were stat'ing
+            if pending.deadline != deadline:
+                # New activity arrived while we were stat'ing
+                if pending.scheduled == deadline:
+                    self._schedule(path, pending)
+                return
+            stable = stat_result.st_size > 0 and (
+                pending.closed or pending.last_stat == version)
+            if not stable:
+                # A file that keeps changing is still being written; only an
+                # empty file that never grows is given up on
+                if stat_result.st_size == 0 and now - pending.first_seen > self.max_pending_age:
+                    logger.info("Removing stale tracking for: %s", path)
+                    del self._pending[path]
+                    return
+                pending.last_stat = version
+                pending.deadline = now + self.quiet_period
+                self._schedule(path, pending)
+                return
+            del self._pending[path]
+
+        key = (stat_result.st_dev, stat_result.st_ino) + version
+        reported_path = self._completed.get(key)
+        self._completed.add(key, path)
+        if reported_path is not None:
+            if reported_path != path:
+                self.renames += 1
+                logger.info("Detected rename: %s -> %s", reported_path, path)
+            return
+        logger.debug("%s settled after %d events", path, pending.events)
+
+        try:
+            self.on_complete(path, stat_result)
+        except Exception as e:
+            logger.exception("Error handling completed file %s: %s", path, e)
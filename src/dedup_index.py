@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExpiringIndex:
+    """Insertion-ordered index with O(1) lookups, evicting by entry count and age"""
+
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key, value=None):
+        """Insert or refresh a key, making it the most recent entry"""
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _live_entry(self, key, now):
+        """Return the entry for a key if it has not expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and now - entry[1] > self.ttl:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        """Return the value stored for a key"""
+        with self._lock:
+            entry = self._live_entry(key, time.monotonic())
+        return default if entry is None else entry[0]
+
+    def discard(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def prune(self):
+        """Drop expired entries from the oldest end"""
+        if self.ttl is None:
+            return
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            # Entries are kept in insertion order, so expired ones are all at the front
+            while self._entries:
+                key, (_, added) = next(iter(self._entries.items()))
+                if added > cutoff:
+                    break
+                del self._entries[key]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live_entry(key, time.monotonic()) is not None
+
+    def __len__(self):
+        return len(self._entries)
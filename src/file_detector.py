@@ -1,22 +1,51 @@
-import utils
-import time
+from hash_cache import HashCache
+from dedup_index import ExpiringIndex
+from completion import CompletionDetector
+from watch_config import DEFAULT_EXCLUDE, PathMatcher
+import metrics
+import logging
 import os
 import sys
+import time
 from pathlib import Path
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 
 # Add src directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+logger = logging.getLogger(__name__)
+
 
 class FileDetector(FileSystemEventHandler):
     """Base class for detecting file system events"""
 
-    def __init__(self):
-        self.open_files = {}
+    def __init__(
+        self,
+        hash_algorithm="md5",
+        dedup_max_entries=1000,
+        dedup_ttl=3600,
+        quiet_period=2.0,
+        watch_roots=None,
+        rename_window=0.25,
+    ):
+        # Per-root include/exclude rules; without roots only partial downloads are ignored
+        self.watch_roots = watch_roots
+        self._default_exclude = PathMatcher(DEFAULT_EXCLUDE)
+        self.hash_cache = HashCache(hash_algorithm)
         self.callbacks = []
-        self.processed_hashes = set()  # Track hashes of processed files
-        self.pending_moves = {}  # Track files that might be renamed
+        # Write events are debounced until each file stops changing
+        self.completion = CompletionDetector(
+            self._on_write_complete, quiet_period, rename_window=rename_window)
+        # Track hashes of processed files
+        self.processed_hashes = ExpiringIndex(dedup_max_entries, dedup_ttl)
+
+    def start(self):
+        """Start checking tracked files for completion"""
+        self.completion.start()
+
+    def stop(self):
+        """Stop checking tracked files for completion"""
+        self.completion.stop()
 
     def add_callback(self, callback):
         """Add a callback function to be called when a file is processed"""
@@ -27,175 +56,115 @@ class FileDetector(FileSystemEventHandler):
         if event.is_directory:
             return
 
-        if self._is_temp_file(event.src_path):
+        if self.is_ignored(event.src_path):
             return
 
-        print(f"New file detected: {event.src_path}")
-        self.open_files[event.src_path] = time.time()
+        logger.debug("New file detected: %s", event.src_path)
+        self.completion.touch(event.src_path)
 
-        # Check if this might be a renamed file by checking if we have a pending move
-        # with similar size and recent timestamp
-        self._check_for_potential_rename(event.src_path)
+    def on_modified(self, event: FileSystemEvent) -> None:
+        """Called when a file is written to"""
+        if event.is_directory or self.is_ignored(event.src_path):
+            return
+
+        self.completion.touch(event.src_path)
 
     def on_moved(self, event: FileSystemEvent) -> None:
         """Called when a file is moved or renamed"""
         if event.is_directory:
             return
 
-        # Filter out temporary files
-        if self._is_temp_file(event.dest_path):
+        # Filter out temporary and excluded files
+        if self.is_ignored(event.dest_path):
+            self.completion.discard(event.src_path)
             return
-        print(f"File moved/renamed: {event.src_path} -> {event.dest_path}")
+        logger.debug("File moved/renamed: %s -> %s", event.src_path, event.dest_path)
 
-        # If the source file was being tracked, remove it from tracking
-        if event.src_path in self.open_files:
-            del self.open_files[event.src_path]
-
-        # Check if this is a file we should process
-        if os.path.exists(event.dest_path) and os.path.getsize(event.dest_path) > 0:
-            # Check if we've already processed this content
-            try:
-                file_hash = utils.get_file_hash(event.dest_path)
-                if file_hash in self.processed_hashes:
-                    print(f"""Skipping already processed content: {
-                          event.dest_path}""")
-                    return
-
-                # Add to pending moves for potential duplicate detection
-                self.pending_moves[event.dest_path] = {
-                    'hash': file_hash,
-                    'timestamp': time.time()
-                }
-
-                # Process the renamed file
-                self._handle_completed_download(event.dest_path)
-            except Exception as e:
-                print(f"Error handling moved file: {str(e)}")
+        # Renames are folded with the file's other events; a reported file
+        # renamed again is recognised by its inode, without rehashing
+        self.completion.rename(event.src_path, event.dest_path)
 
     def on_closed(self, event: FileSystemEvent) -> None:
-        """Called when a file is closed"""
+        """Called when a file is closed after writing (inotify only)"""
         if event.is_directory:
             return
 
-        # Check if this was a file we were tracking
-        if event.src_path in self.open_files:
-            # File has been closed after writing - download completed
-            del self.open_files[event.src_path]
-
-            # Verify the file actually exists and has content
-            if os.path.exists(event.src_path) and os.path.getsize(event.src_path) > 0:
-                # Check if we've already processed this content
-                try:
-                    file_hash = utils.get_file_hash(event.src_path)
-                    if file_hash in self.processed_hashes:
-                        print(f"""Skipping already processed content: {
-                              event.src_path}""")
-                        return
-
-                    # Add to pending moves for potential duplicate detection
-                    self.pending_moves[event.src_path] = {
-                        'hash': file_hash,
-                        'timestamp': time.time()
-                    }
-
-                    self._handle_completed_download(event.src_path)
-                except Exception as e:
-                    print(f"Error calculating file hash: {str(e)}")
-                    # Still process the file even if hashing fails
-                    self._handle_completed_download(event.src_path)
-
-    def _is_temp_file(self, filepath: str) -> bool:
-        """Filter out temporary browser download files"""
-        temp_extensions = {'.crdownload', '.part', '.tmp', '.download'}
-        return any(filepath.endswith(ext) for ext in temp_extensions)
-
-    def _handle_completed_download(self, filepath: str) -> None:
+        # The writer is done, so the file can be checked without waiting
+        self.completion.closed(event.src_path)
+
+    def on_deleted(self, event: FileSystemEvent) -> None:
+        """Called when a file is deleted"""
+        if not event.is_directory:
+            self.completion.discard(event.src_path)
+
+    def is_ignored(self, filepath: str) -> bool:
+        """Filter out temporary browser download files and paths excluded by their root"""
+        if self.watch_roots is None:
+            return self._default_exclude.matches(os.path.basename(filepath))
+        return self.watch_roots.is_ignored(filepath)
+
+    def _on_write_complete(self, filepath: str, stat_result) -> None:
+        """Called once per file version when it has stopped changing"""
+        # Check if we've already processed this content
+        try:
+            file_hash = self.hash_cache.get(filepath, stat_result)
+        except Exception as e:
+            logger.warning("Error calculating file hash for %s: %s", filepath, e)
+            # Still process the file even if hashing fails
+            self._handle_completed_download(filepath)
+            return
+
+        if file_hash in self.processed_hashes:
+            logger.info("Skipping already processed content: %s", filepath)
+            metrics.inc("declutter_files_total", status="duplicate")
+            return
+        self._handle_completed_download(filepath, file_hash)
+
+    def _handle_completed_download(self, filepath: str, file_hash: str = None) -> None:
         """Called when a download is confirmed complete"""
         filename = os.path.basename(filepath)
         file_ext = Path(filepath).suffix.lower()
-        file_size = os.path.getsize(filepath)
+        stat_result = os.stat(filepath)
+        file_size = stat_result.st_size
 
-        print("\nDownload complete!")
-        print(f"   File: {filename}")
-        print(f"   Path: {filepath}")
-        print(f"   Type: {file_ext}")
-        print(f"   Size: {file_size:,} bytes")
+        logger.info("Download complete: %s (%s bytes)", filepath, f"{file_size:,}")
 
-        # Calculate and store file hash to prevent duplicate processing
+        # Store the file hash to prevent duplicate processing
         try:
-            file_hash = utils.get_file_hash(filepath)
+            if file_hash is None:
+                file_hash = self.hash_cache.get(filepath)
             self.processed_hashes.add(file_hash)
-            print(f"   Hash: {file_hash}")
+            logger.debug("Hash of %s: %s", filename, file_hash)
         except Exception as e:
-            print(f"   Warning: Could not calculate file hash - {str(e)}")
+            logger.warning("Could not calculate file hash for %s: %s", filepath, e)
 
         # Call all registered callbacks with the file info
         file_info = {
             'path': filepath,
             'name': filename,
             'extension': file_ext,
-            'size': file_size
+            'size': file_size,
+            'mtime': stat_result.st_mtime,
+            'hash': file_hash,
+            'root': self._root_path(filepath),
+            'detected': time.monotonic(),
         }
 
         for callback in self.callbacks:
             try:
                 callback(file_info)
             except Exception as e:
-                print(f"   Error in callback: {str(e)}")
-
-        print("-" * 50)
-
-    def cleanup_stale_tracking(self, timeout=300):
-        """Remove files from tracking if they've been open too long"""
-        current_time = time.time()
-
-        # Clean up stale open files
-        stale_files = [
-            path for path, open_time in self.open_files.items()
-            if current_time - open_time > timeout
-        ]
-        for path in stale_files:
-            print(f"Removing stale tracking for: {path}")
-            del self.open_files[path]
-
-        # Clean up old pending moves (older than 5 minutes)
-        stale_moves = [
-            path for path, move_info in self.pending_moves.items()
-            if current_time - move_info['timestamp'] > 300
-        ]
-        for path in stale_moves:
-            del self.pending_moves[path]
-
-        # Clean up old processed hashes (keep only last 1000 to prevent memory issues)
-        if len(self.processed_hashes) > 1000:
-            # Convert to list and keep only the most recent 1000
-            hash_list = list(self.processed_hashes)
-            self.processed_hashes = set(hash_list[-1000:])
-
-    def _check_for_potential_rename(self, filepath: str) -> None:
-        """Check if a new file might be a renamed version of an existing file"""
-        try:
-            if not os.path.exists(filepath):
-                return
-
-            current_time = time.time()
-            current_hash = utils.get_file_hash(filepath)
-
-            # Check if this file matches any recently processed file
-            for pending_path, pending_info in self.pending_moves.items():
-                # Skip if it's the same file
-                if pending_path == filepath:
-                    continue
-
-                # Check if the hash matches (same content)
-                if pending_info['hash'] == current_hash:
-                    # Check if the pending file was processed recently (within 30 seconds)
-                    if current_time - pending_info['timestamp'] < 30:
-                        print(f"""Detected potential rename: {
-                              pending_path} -> {filepath}""")
-                        # Mark this as already processed by adding its hash
-                        self.processed_hashes.add(current_hash)
-                        return
-        except Exception as e:
-            # Don't let errors in rename detection break normal processing
-            pass
+                logger.exception("Error in callback for %s: %s", filepath, e)
+
+    def _root_path(self, filepath: str):
+        """Path of the watch root a file belongs to, if roots are configured"""
+        if self.watch_roots is None:
+            return None
+        root = self.watch_roots.root_for(filepath)
+        return root.path if root is not None else None
+
+    def cleanup_stale_tracking(self):
+        """Expire old processed hashes"""
+        # The index is already bounded by entry count, so this only trims by age;
+        # files still being written are tracked by the completion detector's timer
+        self.processed_hashes.prune()
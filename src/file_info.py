@@ -1,25 +1,29 @@
+import logging
 import utils
 
+logger = logging.getLogger(__name__)
+
 
 def display_file_info(file_info):
     """Display basic information about any file"""
-    print(f"   File: {file_info['name']}")
-    print(f"   Path: {file_info['path']}")
-    print(f"   Type: {file_info['extension']}")
-    print(f"   Size: {file_info['size']:,} bytes")
+    logger.debug("File: %s, path: %s, type: %s, size: %s bytes", file_info['name'],
+                 file_info['path'], file_info['extension'], f"{file_info['size']:,}")
 
 
-def display_pdf_info(file_path):
+def display_pdf_info(file_path, metadata=None):
     """Display additional information for PDF files"""
     if not utils.is_pdf(file_path):
         return
 
+    # Reading metadata is only worth it when the details will be shown
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+
     try:
-        metadata = utils.extract_metadata_from_pdf(file_path)
-        print(f"   Pages: {metadata.get('page_count', 'Unknown')}")
-        if metadata.get('title'):
-            print(f"   Title: {metadata['title']}")
-        if metadata.get('author'):
-            print(f"   Author: {metadata['author']}")
+        if metadata is None:
+            metadata = utils.extract_metadata_from_pdf(file_path)
+        logger.debug("PDF %s: %s pages, title: %s, author: %s", file_path,
+                     metadata.get('page_count', 'Unknown'), metadata.get('title') or '-',
+                     metadata.get('author') or '-')
     except Exception as e:
-        print(f"   Warning: Could not extract PDF metadata - {str(e)}")
+        logger.warning("Could not extract PDF metadata from %s: %s", file_path, e)
@@ -1,81 +1,68 @@
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage
+import errno
+import logging
 import os
 import shutil
+import uuid
 from pathlib import Path
+import metrics
 import utils
+from keyword_matcher import ReloadingKeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 class FileOrganizerAgent:
     """Agent that analyzes file content and organizes files into appropriate directories"""
 
-    def __init__(self, inference_host, organization_base_dir):
-        self.client = ChatOllama(model="qwen3-vl:2b", base_url=inference_host)
+    def __init__(self, organization_base_dir, categories_path=None, create_directories=True):
         self.organization_base_dir = Path(organization_base_dir)
+        self.keyword_matcher = ReloadingKeywordMatcher(categories_path)
+        # A dry run only plans moves, so it leaves the filesystem untouched
+        self.create_directories = create_directories
         self._ensure_base_directory_exists()
         self._setup_categories()
 
     def _ensure_base_directory_exists(self):
         """Ensure the base organization directory exists"""
-        if not self.organization_base_dir.exists():
+        if self.create_directories and not self.organization_base_dir.exists():
             self.organization_base_dir.mkdir(parents=True, exist_ok=True)
-            print(
-                f"""Created organization base directory: {self.organization_base_dir}"""
-            )
+            logger.info("Created organization base directory: %s", self.organization_base_dir)
 
     def _setup_categories(self):
-        """Define hard-coded categories and their keywords"""
+        """Load categories and their keywords, creating a directory for each"""
         self.categories = {
-            "documents": [
-                "document",
-                "text",
-                "pdf",
-                "report",
-                "paper",
-                "article",
-                "manual",
-                "guide",
-                "ebook",
-                "book",
-            ],
-            "images": [
-                "photo",
-                "picture",
-                "image",
-                "photograph",
-                "screenshot",
-                "graphic",
-                "visual",
-            ],
-            "invoices": ["invoice", "bill", "receipt", "payment", "statement"],
-            "presentations": ["presentation", "slide", "powerpoint", "ppt"],
-            "spreadsheets": ["spreadsheet", "excel", "csv", "data", "table"],
-            "misc": ["unknown", "other", "miscellaneous", "misc"],
+            name: list(spec.get("keywords", []))
+            for name, spec in self.keyword_matcher.matcher.categories.items()
         }
 
+        if not self.create_directories:
+            return
+
         # Create category directories if they don't exist
         for category in self.categories:
             category_dir = self.organization_base_dir / category
             if not category_dir.exists():
                 category_dir.mkdir(exist_ok=True)
-                print(f"Created category directory: {category_dir}")
+                logger.info("Created category directory: %s", category_dir)
+        fallback_dir = self.organization_base_dir / self.keyword_matcher.matcher.fallback
+        fallback_dir.mkdir(exist_ok=True)
+
+    def current_categories(self):
+        """Category names, picking up edits to the categories file first"""
+        if self.keyword_matcher.reload_if_changed():
+            self._setup_categories()
+        return list(self.categories)
 
     def determine_category(self, file_description):
         """Determine the appropriate category based on file description"""
-        # Convert description to lowercase for case-insensitive matching
-        description_lower = file_description.lower()
-
-        # Check each category for matching keywords
-        for category, keywords in self.categories.items():
-            if category == "misc":
-                continue  # Skip misc for now, use as fallback
-
-            for keyword in keywords:
-                if keyword in description_lower:
-                    return category
+        # Pick up edits to the categories file without restarting
+        if self.keyword_matcher.reload_if_changed():
+            self._setup_categories()
 
-        # If no match found, return misc
-        return "misc"
+        # One pass over the description scores every category at once
+        return self.keyword_matcher.matcher.best(file_description)
 
     def organize_file(self, file_path, file_description):
         """Organize a file into the appropriate category directory"""
@@ -89,43 +76,162 @@ class FileOrganizerAgent:
             # Get the filename
             filename = Path(file_path).name
 
-            # Check if file already exists in target directory
-            target_path = target_dir / filename
-            if target_path.exists():
-                # File exists, move to misc folder instead
-                misc_dir = self.organization_base_dir / "misc"
-                target_path = misc_dir / filename
-                print(
-                    f"""File {filename} already exists in {
-                        category
-                    } directory. Moving to misc folder."""
-                )
-
-            # Move the file
-            shutil.move(file_path, target_path)
-
-            print(f"✅ Organized {filename} to {category} folder")
+            # Move the file, picking a unique name if the target already exists
+            size = os.path.getsize(file_path)
+            with metrics.stage("move", file_path):
+                target_path, bytes_copied = self._move_file(file_path, target_dir, filename)
+            metrics.inc("declutter_bytes_moved_total", size)
+            if bytes_copied:
+                metrics.inc("declutter_bytes_copied_total", bytes_copied)
+            if target_path.name != filename:
+                logger.info("File %s already exists in %s directory. Saved as %s.",
+                            filename, category, target_path.name)
+
+            logger.info("Organized %s to %s folder", filename, category)
             return {
                 "status": "success",
                 "original_path": file_path,
                 "new_path": str(target_path),
                 "category": category,
+                "bytes_copied": bytes_copied,
                 "message": f"File moved to {category} directory",
             }
 
         except Exception as e:
-            error_msg = f"❌ Failed to organize {file_path}: {str(e)}"
-            print(error_msg)
+            error_msg = f"Failed to organize {file_path}: {str(e)}"
+            logger.error(error_msg)
             return {"status": "error", "original_path": file_path, "message": error_msg}
 
+    @staticmethod
+    def _candidate_names(filename):
+        """Yield the filename, then "name (1).ext", "name (2).ext", ..."""
+        yield filename
+        stem, suffix = Path(filename).stem, Path(filename).suffix
+        for number in range(1, 1000):
+            yield f"{stem} ({number}){suffix}"
+        yield f"{stem} ({uuid.uuid4().hex[:8]}){suffix}"
+
+    def _claim_name(self, source, target_dir, filename):
+        """Atomically give source a free name in target_dir, returning the new path
+
+        source must be on the same filesystem as target_dir. A hard link fails
+        if the name is taken, so no existing file can be overwritten even when
+        several workers pick the same name at once.
+        """
+        for name in self._candidate_names(filename):
+            target_path = target_dir / name
+            try:
+                os.link(source, target_path)
+            except FileExistsError:
+                continue
+            except OSError as e:
+                if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK):
+                    raise
+                # No hard links here: reserve the name exclusively, then replace it
+                try:
+                    os.close(os.open(target_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                except FileExistsError:
+                    continue
+                try:
+                    os.replace(source, target_path)
+                except BaseException:
+                    target_path.unlink(missing_ok=True)
+                    raise
+                return target_path
+            os.unlink(source)
+            return target_path
+        raise FileExistsError(f"No free name for {filename} in {target_dir}")
+
+    def _copy_to_temp(self, source, target_dir):
+        """Stream source into a hidden temp file in target_dir, fsync it and return (path, bytes)"""
+        temp_path = target_dir / f".{Path(source).name}.{uuid.uuid4().hex[:8]}.declutter-tmp"
+        copied = 0
+        with open(source, "rb") as src:
+            size = os.fstat(src.fileno()).st_size
+            fd = os.open(temp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            try:
+                with os.fdopen(fd, "wb") as dst:
+                    copied = self._kernel_copy(src, dst, size)
+                    if copied < size:
+                        # Fall back to a plain buffered copy of whatever is left
+                        src.seek(copied)
+                        dst.seek(copied)
+                        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+                        copied = dst.tell()
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                shutil.copystat(source, temp_path)
+            except BaseException:
+                temp_path.unlink(missing_ok=True)
+                raise
+        return temp_path, copied
+
+    @staticmethod
+    def _kernel_copy(src, dst, size):
+        """Copy in the kernel where possible instead of through Python buffers, returning bytes copied
+
+        Stops early, leaving the rest to the caller, where neither
+        copy_file_range nor sendfile exists (Windows) or the call fails before
+        copying anything, e.g. sendfile to a regular file on macOS (ENOTSOCK).
+        """
+        copy_file_range = getattr(os, "copy_file_range", None)
+        sendfile = getattr(os, "sendfile", None)
+        copied = 0
+        try:
+            while copied < size:
+                if copy_file_range is not None:
+                    sent = copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_SIZE)
+                elif sendfile is not None:
+                    sent = sendfile(dst.fileno(), src.fileno(), copied, COPY_CHUNK_SIZE)
+                else:
+                    break
+                if sent == 0:
+                    break
+                copied += sent
+        except OSError as e:
+            if copied and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+                raise
+        return copied
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """Persist a rename by syncing the directory entry"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return  # directories cannot be opened on Windows; renames there are not fsynced
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _move_file(self, file_path, target_dir, filename):
+        """Move a file into target_dir without overwriting, returning (new path, bytes copied)
+
+        On the same filesystem this is a metadata-only rename. Across devices the
+        file is copied to a temp name, fsynced and renamed into place before the
+        original is removed, so a crash never leaves a partial file under the
+        final name.
+        """
+        if os.stat(file_path).st_dev == os.stat(target_dir).st_dev:
+            try:
+                return self._claim_name(file_path, target_dir, filename), 0
+            except OSError as e:
+                # Bind mounts of one filesystem share st_dev but still refuse links across them
+                if e.errno != errno.EXDEV:
+                    raise
+
+        temp_path, copied = self._copy_to_temp(file_path, target_dir)
+        try:
+            target_path = self._claim_name(temp_path, target_dir, filename)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        self._fsync_directory(target_dir)
+        os.unlink(file_path)
+        return target_path, copied
+
     def get_category_description(self, category):
         """Get a description of what each category contains"""
-        descriptions = {
-            "documents": "Text documents, reports, articles, PDFs, books",
-            "images": "Photos, pictures, screenshots, graphics",
-            "invoices": "Invoices, bills, receipts, payment statements",
-            "presentations": "Presentations, slides, PowerPoint files",
-            "spreadsheets": "Spreadsheets, Excel files, CSV data, tables",
-            "misc": "Files that don't fit other categories",
-        }
-        return descriptions.get(category, "Unknown category")
+        description = self.keyword_matcher.matcher.descriptions.get(category)
+        return description or "Unknown category"
@@ -0,0 +1,45 @@
+import os
+import threading
+from collections import OrderedDict
+import metrics
+import utils
+
+
+class HashCache:
+    """Content hashes keyed on (device, inode) and validated against size and mtime"""
+
+    def __init__(self, algorithm="md5", max_entries=4096):
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path, stat_result=None):
+        """Return the content hash, reading the file only if it changed"""
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+        # Keying on the inode means a rename keeps its cached hash
+        key = (stat_result.st_dev, stat_result.st_ino)
+        version = (stat_result.st_size, stat_result.st_mtime_ns)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("declutter_cache_requests_total", cache="hash", result="hit")
+                return cached[1]
+            self.misses += 1
+        metrics.inc("declutter_cache_requests_total", cache="hash", result="miss")
+
+        with metrics.stage("hash", file_path):
+            file_hash = utils.get_file_hash(file_path, self.algorithm)
+
+        with self._lock:
+            self._entries[key] = (version, file_hash)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return file_hash
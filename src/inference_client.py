@@ -0,0 +1,189 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceUnavailable(Exception):
+    """Raised when the model host is considered down and calls are not attempted"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing host until it has had time to recover"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may be attempted right now"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # After the reset timeout a single probe call is let through
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        "Inference host failing, pausing calls for %ss", self.reset_timeout)
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class InferenceClient:
+    """Shared Ollama client with connection reuse, timeouts, retries and a circuit breaker
+
+    The LangChain/Ollama stack is imported and the chat model built on first
+    use or by connect(), so creating a client is cheap at startup.
+    """
+
+    def __init__(
+        self,
+        inference_host,
+        model="qwen3-vl:2b",
+        timeout=120,
+        max_retries=2,
+        retry_backoff=0.5,
+        max_connections=8,
+        failure_threshold=5,
+        reset_timeout=30,
+        keep_alive=None,
+    ):
+        self.inference_host = inference_host
+        self.model = model
+        self.timeout = timeout
+        # How long Ollama keeps a model loaded after a request; -1 pins it
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_connections = max_connections
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._chat = None
+        self._connect_lock = threading.Lock()
+
+    def connect(self):
+        """Import the Ollama stack and build the chat model, once"""
+        with self._connect_lock:
+            if self._chat is None:
+                import httpx
+                from langchain_ollama import ChatOllama
+
+                # One httpx connection pool with keep-alive serves every worker thread
+                self._chat = ChatOllama(
+                    model=self.model,
+                    base_url=self.inference_host,
+                    keep_alive=self.keep_alive,
+                    client_kwargs={
+                        "timeout": httpx.Timeout(self.timeout, connect=min(self.timeout, 10)),
+                        "limits": httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                    },
+                )
+        return self._chat
+
+    @property
+    def chat(self):
+        return self._chat or self.connect()
+
+    @staticmethod
+    def _is_retryable(error):
+        """Transport failures, timeouts and server errors are worth retrying"""
+        import httpx
+        from ollama import ResponseError
+
+        if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        if isinstance(error, ResponseError):
+            return error.status_code >= 500 or error.status_code == 429
+        return False
+
+    def warm_up(self, model=None):
+        """Load a model on the host ahead of the first request, returning whether it loaded"""
+        model = model or self.model
+        from ollama import Client
+
+        started = time.perf_counter()
+        try:
+            # A generate request without a prompt only loads the model
+            Client(host=self.inference_host, timeout=self.timeout).generate(
+                model=model, keep_alive=self.keep_alive)
+        except Exception as e:
+            logger.warning("Could not warm up model %s: %s", model, e)
+            return False
+        logger.info("Model %s loaded in %.1fs", model, time.perf_counter() - started)
+        return True
+
+    def invoke(self, messages, **kwargs):
+        """Send one chat request, retrying transient failures with jittered backoff
+
+        Pass model= to use another model on the same host for this request.
+        """
+        if not self.breaker.allow():
+            metrics.inc("declutter_inference_errors_total", reason="circuit_open")
+            raise InferenceUnavailable(
+                f"Inference host {self.inference_host} is unavailable")
+
+        attempt = 0
+        while True:
+            try:
+                response = self.chat.invoke(messages, **kwargs)
+                self.breaker.record_success()
+                return response
+            except Exception as e:
+                if not self._is_retryable(e):
+                    # The host answered, so it is up even though this request failed
+                    self.breaker.record_success()
+                    metrics.inc("declutter_inference_errors_total", reason="error")
+                    raise
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    metrics.inc("declutter_inference_errors_total", reason="unavailable")
+                    raise InferenceUnavailable(
+                        f"Inference host {self.inference_host} is unavailable: {str(e)}"
+                    ) from e
+                # Full jitter keeps many workers from retrying in lockstep
+                metrics.inc("declutter_inference_retries_total")
+                time.sleep(random.uniform(0, self.retry_backoff * (2 ** attempt)))
+                attempt += 1
+
+    def batch(self, inputs, config=None, return_exceptions=False, **kwargs):
+        """Send several chat requests concurrently, each with its own retries"""
+        max_concurrency = (config or {}).get("max_concurrency") or len(inputs) or 1
+
+        def call(messages):
+            try:
+                return self.invoke(messages, **kwargs)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(call, inputs))
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# file_info fields needed to resubmit a file; the rest is rebuilt on resume
+JOB_FIELDS = ("path", "name", "extension", "size", "mtime", "hash", "root")
+
+
+class JobJournal:
+    """Append-only JSON-lines journal of pipeline stages, so unfinished files resume after a restart
+
+    Each line records one stage of one file: "queued", "extracted" (with the
+    PDF sample), "classified" (with the result) or "done". Lines are buffered
+    and a writer thread appends everything that arrived within commit_interval
+    with a single fsync, so workers never wait on the disk. Files still open
+    when the daemon stopped are returned by pending(); the journal is rewritten
+    with only those once compact_after lines have been written.
+    """
+
+    def __init__(self, path, commit_interval=0.05, compact_after=10000):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.commit_interval = commit_interval
+        self.compact_after = compact_after
+        self._jobs = self._load()  # path -> merged stages of unfinished files
+        self._pending = list(self._jobs.values())
+        self._buffer = []
+        self._lines_since_compact = 0
+        self._closing = False
+        self._condition = threading.Condition()
+
+        self._compact()
+        self._thread = threading.Thread(
+            target=self._writer, name="declutter-journal", daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        """Fold the journal into the last known state of every unfinished file"""
+        jobs = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by a crash
+                    self._apply(jobs, record)
+        except FileNotFoundError:
+            pass
+        return jobs
+
+    @staticmethod
+    def _apply(jobs, record):
+        if record["stage"] == "done":
+            jobs.pop(record["path"], None)
+        else:
+            jobs.setdefault(record["path"], {}).update(record)
+
+    def pending(self):
+        """Files that had not finished when the journal was last closed, oldest first"""
+        return list(self._pending)
+
+    def record(self, file_info, stage, **data):
+        """Append a stage for a file; it becomes durable with the next group commit"""
+        record = {"path": file_info["path"], "stage": stage, "ts": time.time(), **data}
+        if stage == "queued":
+            record.update(
+                (field, file_info[field]) for field in JOB_FIELDS if field in file_info)
+        line = json.dumps(record, default=str) + "\n"
+        with self._condition:
+            self._apply(self._jobs, record)
+            self._buffer.append(line)
+            self._condition.notify()
+
+    def submit(self, pipeline, file_info):
+        """Submit a file to a ProcessingPipeline, journaling "queued" before a worker can finish it
+
+        A file accepted but then dropped because the queue stayed full is
+        closed as "dropped"; one already in flight is left to its own job.
+        """
+        accepted = False
+
+        def on_accept():
+            nonlocal accepted
+            accepted = True
+            self.record(file_info, "queued")
+
+        if pipeline.submit(file_info, on_accept):
+            return True
+        if accepted:
+            self.record(file_info, "done", status="dropped")
+        return False
+
+    def _writer(self):
+        """Write buffered stages in groups, one fsync per group"""
+        journal = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                with self._condition:
+                    while not self._buffer and not self._closing:
+                        self._condition.wait()
+                    if not self._buffer:
+                        return
+                    closing = self._closing
+                if not closing:
+                    # Stages recorded meanwhile share this commit
+                    time.sleep(self.commit_interval)
+                with self._condition:
+                    lines, self._buffer = self._buffer, []
+                with metrics.stage("journal_commit"):
+                    journal.write("".join(lines))
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self._lines_since_compact += len(lines)
+                if self._lines_since_compact >= self.compact_after:
+                    journal.close()
+                    self._compact()
+                    journal = open(self.path, "a", encoding="utf-8")
+        finally:
+            journal.close()
+
+    def _compact(self):
+        """Atomically rewrite the journal with only the unfinished files"""
+        with self._condition:
+            jobs = [dict(job) for job in self._jobs.values()]
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            for job in jobs:
+                f.write(json.dumps(job, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self._lines_since_compact = 0
+        logger.debug("Compacted job journal to %d unfinished files", len(jobs))
+
+    def close(self):
+        """Commit everything recorded so far and stop the writer"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify()
+        self._thread.join()
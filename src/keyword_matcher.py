@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Built-in categories; earlier entries win ties, as the old dict order did
+DEFAULT_CATEGORIES = {
+    "documents": {
+        "keywords": [
+            "document", "text", "pdf", "report", "paper",
+            "article", "manual", "guide", "ebook", "book",
+        ],
+        "priority": 50,
+        "description": "Text documents, reports, articles, PDFs, books",
+    },
+    "images": {
+        "keywords": [
+            "photo", "picture", "image", "photograph",
+            "screenshot", "graphic", "visual",
+        ],
+        "priority": 40,
+        "description": "Photos, pictures, screenshots, graphics",
+    },
+    "invoices": {
+        "keywords": ["invoice", "bill", "receipt", "payment", "statement"],
+        "priority": 30,
+        "description": "Invoices, bills, receipts, payment statements",
+    },
+    "presentations": {
+        "keywords": ["presentation", "slide", "powerpoint", "ppt"],
+        "priority": 20,
+        "description": "Presentations, slides, PowerPoint files",
+    },
+    "spreadsheets": {
+        "keywords": ["spreadsheet", "excel", "csv", "data", "table"],
+        "priority": 10,
+        "description": "Spreadsheets, Excel files, CSV data, tables",
+    },
+    "misc": {
+        "keywords": ["unknown", "other", "miscellaneous", "misc"],
+        "priority": 0,
+        "description": "Files that don't fit other categories",
+    },
+}
+
+
+class KeywordMatcher:
+    """Scores every category in one regex pass over a piece of text
+
+    Each category maps to keywords given either as a list (weight 1) or as
+    {keyword: weight}. Keywords match whole words, with optional plural "s"/"es".
+    The highest total weight wins; ties go to the higher priority.
+    """
+
+    def __init__(self, categories, fallback="misc"):
+        self.categories = categories
+        self.fallback = fallback
+        self.priorities = {
+            name: spec.get("priority", 0) for name, spec in categories.items()}
+        self.descriptions = {
+            name: spec.get("description", "") for name, spec in categories.items()}
+
+        self._weights = {}  # keyword -> [(category, weight), ...]
+        for name, spec in categories.items():
+            keywords = spec.get("keywords", [])
+            if not isinstance(keywords, dict):
+                keywords = {keyword: 1.0 for keyword in keywords}
+            # The category name itself always counts, so the model can answer with it
+            keywords = {name: 1.0, **keywords}
+            for keyword, weight in keywords.items():
+                self._weights.setdefault(keyword.lower(), []).append((name, float(weight)))
+
+        # Longest first so "invoice number" wins over "invoice" at the same position
+        alternatives = sorted(self._weights, key=len, reverse=True)
+        self._regex = re.compile(
+            r"\b(" + "|".join(re.escape(k) for k in alternatives) + r")(?:e?s)?\b",
+            re.IGNORECASE,
+        )
+
+    def scores(self, text):
+        """Total keyword weight per category found in text"""
+        totals = {}
+        for match in self._regex.finditer(text):
+            for category, weight in self._weights[match.group(1).lower()]:
+                totals[category] = totals.get(category, 0.0) + weight
+        return totals
+
+    def best(self, text):
+        """The best scoring category, or the fallback when nothing matches"""
+        totals = self.scores(text)
+        if not totals:
+            return self.fallback
+        return max(totals, key=lambda name: (totals[name], self.priorities.get(name, 0)))
+
+
+class ReloadingKeywordMatcher:
+    """Keeps a KeywordMatcher in sync with a JSON config file, rebuilding it when the file changes
+
+    The file looks like:
+    {"categories": {"tax": {"keywords": {"hmrc": 2, "tax return": 3},
+                            "priority": 60, "description": "Tax paperwork"}}}
+    Without a file the built-in categories are used.
+    """
+
+    def __init__(self, config_path=None, check_interval=2.0):
+        self.config_path = os.path.expanduser(config_path) if config_path else None
+        self.check_interval = check_interval
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.matcher = self._load()
+
+    def _load(self):
+        if self.config_path is None:
+            return KeywordMatcher(DEFAULT_CATEGORIES)
+        self._mtime = os.stat(self.config_path).st_mtime_ns
+        with open(self.config_path) as f:
+            config = json.load(f)
+        return KeywordMatcher(config["categories"], config.get("fallback", "misc"))
+
+    def reload_if_changed(self):
+        """Rebuild the matcher if the config file changed, returning True when it did"""
+        if self.config_path is None:
+            return False
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            self._checked = now
+            try:
+                if os.stat(self.config_path).st_mtime_ns == self._mtime:
+                    return False
+                # Swap in the new matcher whole so concurrent readers never see half of it
+                self.matcher = self._load()
+            except Exception as e:
+                logger.warning("Could not reload categories from %s: %s", self.config_path, e)
+                return False
+        logger.info("Reloaded categories from %s", self.config_path)
+        return True
@@ -0,0 +1,37 @@
+import json
+import logging
+import time
+
+# Libraries that log every request or filesystem event at INFO/DEBUG
+NOISY_LOGGERS = ("httpx", "httpcore", "watchdog", "PIL")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log line, for log shippers"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def configure_logging(level="INFO", log_format="text"):
+    """Send leveled log output to stderr as plain text or JSON lines"""
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
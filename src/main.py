@@ -1,100 +1,507 @@
-from file_detector import FileDetector
 from file_organizer import FileOrganizerAgent
-from ai_processor import AIProcessor
+from ai_processor import ROUTES, AIProcessor
+from classification_cache import ClassificationCache
+from similarity_index import SimilarityIndex
+from inference_client import InferenceClient, InferenceUnavailable
+from backlog import BacklogScanner, FileIndex
+from job_journal import JOB_FIELDS, JobJournal
+from watch_config import load_watch_roots
 from file_info import display_pdf_info
+from pipeline import ByteBudget, FilePriority, ProcessingPipeline
+from metrics import MetricsServer
+from logging_setup import configure_logging
+import logging
+import metrics
 import sys
 import utils
 import os
+import threading
 import time
 from dotenv import load_dotenv
-from watchdog.observers import Observer
 
 # Add src directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import modules
 
+logger = logging.getLogger(__name__)
+
+
+def parse_pairs(name, allowed=None):
+    """Comma-separated key=value pairs from an environment variable, skipping malformed ones"""
+    pairs = {}
+    for item in os.getenv(name, "").split(","):
+        if not item.strip():
+            continue
+        key, separator, value = (part.strip() for part in item.partition("="))
+        if not separator or not key or not value:
+            logger.warning("Ignoring %s entry %r: expected key=value", name, item.strip())
+        elif allowed is not None and key not in allowed:
+            logger.warning("Ignoring %s entry %r: %s is not one of %s",
+                           name, item.strip(), key, ", ".join(allowed))
+        else:
+            pairs[key] = value
+    return pairs
+
+
+def parse_extension_weights(name):
+    """Extension=weight pairs from an environment variable, skipping weights that are not numbers"""
+    weights = {}
+    for extension, weight in parse_pairs(name).items():
+        try:
+            weights[extension] = float(weight)
+        except ValueError:
+            logger.warning("Ignoring %s entry %s=%s: weight is not a number", name, extension, weight)
+    return weights
+
 
 load_dotenv()
 DOWNLOADS_PATH = os.getenv("DOWNLOADS_PATH")
+WATCH_CONFIG = os.getenv("WATCH_CONFIG")
 INFERENCE_HOST = os.getenv("INFERENCE_HOST")
 ORGANIZATION_BASE_DIR = os.getenv("ORGANIZATION_BASE_DIR")
+CATEGORIES_PATH = os.getenv("CATEGORIES_PATH")
+INFERENCE_MODEL = os.getenv("INFERENCE_MODEL", "qwen3-vl:2b")
+# Comma-separated route=model pairs, e.g. text=qwen3:1.7b; other routes use INFERENCE_MODEL
+MODEL_ROUTES = parse_pairs("MODEL_ROUTES", ROUTES)
+# Ollama keep_alive: a duration such as 30m, or -1 to keep models loaded
+MODEL_KEEP_ALIVE = os.getenv("MODEL_KEEP_ALIVE", "-1")
+if MODEL_KEEP_ALIVE.lstrip("-").isdigit():
+    MODEL_KEEP_ALIVE = int(MODEL_KEEP_ALIVE)
+MODEL_WARM_UP = os.getenv("MODEL_WARM_UP", "true").lower() in ("1", "true", "yes")
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+INFERENCE_RETRIES = int(os.getenv("INFERENCE_RETRIES", "2"))
+INFERENCE_MAX_CONNECTIONS = int(os.getenv("INFERENCE_MAX_CONNECTIONS", "8"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "4"))
+QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", "100"))
+# Comma-separated extension=weight pairs; a lower weight moves files forward
+PRIORITY_EXTENSION_WEIGHTS = parse_extension_weights("PRIORITY_EXTENSION_WEIGHTS")
+PRIORITY_RECENCY_WEIGHT = float(os.getenv("PRIORITY_RECENCY_WEIGHT", "1"))
+PRIORITY_AGING = float(os.getenv("PRIORITY_AGING", "60"))
+if PRIORITY_AGING <= 0:
+    logger.warning("PRIORITY_AGING must be positive, using 60 instead of %s", PRIORITY_AGING)
+    PRIORITY_AGING = 60.0
+MAX_INFLIGHT_MB = float(os.getenv("MAX_INFLIGHT_MB", "512"))
+HASH_ALGORITHM = os.getenv("HASH_ALGORITHM", "blake2b")
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "1000"))
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "3600"))
+QUIET_PERIOD = float(os.getenv("QUIET_PERIOD", "2"))
+RENAME_WINDOW = float(os.getenv("RENAME_WINDOW", "0.25"))
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "4000"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "10"))
+PDF_SAMPLE_STRATEGY = os.getenv("PDF_SAMPLE_STRATEGY", "first")
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+# Images other than JPEG decode at full size; larger ones are refused (0 disables)
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "25000000")) or None
+SCANNED_PDF_PAGES = int(os.getenv("SCANNED_PDF_PAGES", "2"))
+SCANNED_PDF_DPI = int(os.getenv("SCANNED_PDF_DPI", "100"))
+RULES_CONFIDENCE_THRESHOLD = float(
+    os.getenv("RULES_CONFIDENCE_THRESHOLD", "0.85"))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1"))
+BATCH_WINDOW = float(os.getenv("BATCH_WINDOW", "0.5"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_COMBINE_PDFS = os.getenv(
+    "BATCH_COMBINE_PDFS", "true").lower() in ("1", "true", "yes")
+STRUCTURED_OUTPUT = os.getenv(
+    "STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "32"))
+CACHE_DB_PATH = os.getenv(
+    "CACHE_DB_PATH", os.path.expanduser("~/.declutter/cache.db"))
+STARTUP_SCAN = os.getenv("STARTUP_SCAN", "true").lower() in ("1", "true", "yes")
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.expanduser("~/.declutter/journal.jsonl"))
+JOURNAL_COMMIT_INTERVAL = float(os.getenv("JOURNAL_COMMIT_INTERVAL", "0.05"))
+SCAN_RATE = float(os.getenv("SCAN_RATE", "2"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+CACHE_MAX_AGE_DAYS = float(os.getenv("CACHE_MAX_AGE_DAYS", "90"))
+SIMILARITY_DEDUP = os.getenv(
+    "SIMILARITY_DEDUP", "true").lower() in ("1", "true", "yes")
+SIMILARITY_MAX_DISTANCE = int(os.getenv("SIMILARITY_MAX_DISTANCE", "6"))
+SIMILARITY_MEMORY_ENTRIES = int(os.getenv("SIMILARITY_MEMORY_ENTRIES", "10000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+TRACE_PATH = os.getenv("TRACE_PATH")
 
 
 def main():
-    if not DOWNLOADS_PATH:
-        print("Error: DOWNLOADS_PATH not set in environment variables")
+    # watchdog is only needed by the daemon, not by `organize` reading this module's settings
+    from file_detector import FileDetector
+    from watchdog.observers import Observer
+
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+
+    if not DOWNLOADS_PATH and not WATCH_CONFIG:
+        logger.error("DOWNLOADS_PATH or WATCH_CONFIG not set in environment variables")
         return
 
     if not INFERENCE_HOST:
-        print("Error: INFERENCE_HOST not set in environment variables")
+        logger.error("INFERENCE_HOST not set in environment variables")
         return
 
     if not ORGANIZATION_BASE_DIR:
-        print("Error: ORGANIZATION_BASE_DIR not set in environment variables")
+        logger.error("ORGANIZATION_BASE_DIR not set in environment variables")
         return
 
     # Initialize components
-    file_detector = FileDetector()
-    ai_processor = AIProcessor(INFERENCE_HOST)
-    file_organizer = FileOrganizerAgent(INFERENCE_HOST, ORGANIZATION_BASE_DIR)
+    watch_roots = load_watch_roots(WATCH_CONFIG, DOWNLOADS_PATH)
+    file_detector = FileDetector(
+        HASH_ALGORITHM, DEDUP_MAX_ENTRIES, DEDUP_TTL, QUIET_PERIOD, watch_roots,
+        RENAME_WINDOW)
+    classification_cache = ClassificationCache(
+        CACHE_DB_PATH, CACHE_MAX_ENTRIES, CACHE_MAX_AGE_DAYS)
+    file_index = FileIndex(CACHE_DB_PATH)
+    similarity_index = None
+    if SIMILARITY_DEDUP:
+        similarity_index = SimilarityIndex(
+            CACHE_DB_PATH, SIMILARITY_MAX_DISTANCE, SIMILARITY_MEMORY_ENTRIES, CACHE_MAX_ENTRIES)
+    inference_client = InferenceClient(
+        INFERENCE_HOST,
+        INFERENCE_MODEL,
+        timeout=INFERENCE_TIMEOUT,
+        max_retries=INFERENCE_RETRIES,
+        max_connections=INFERENCE_MAX_CONNECTIONS,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        keep_alive=MODEL_KEEP_ALIVE,
+    )
+    # Each root may send its files to its own output base
+    organizers = {}
+    for root in watch_roots:
+        output_dir = root.output_dir or ORGANIZATION_BASE_DIR
+        if output_dir not in organizers:
+            organizers[output_dir] = FileOrganizerAgent(
+                output_dir, CATEGORIES_PATH)
+    output_dirs = {
+        root.path: root.output_dir or ORGANIZATION_BASE_DIR for root in watch_roots}
+    # Every organizer reads the same categories file; the model is offered
+    # whatever it contains at the time of each request
+    categories = next(iter(organizers.values())).current_categories
+    ai_processor = AIProcessor(
+        INFERENCE_HOST,
+        INFERENCE_MODEL,
+        cache=classification_cache,
+        pdf_max_chars=PDF_MAX_CHARS,
+        pdf_max_pages=PDF_MAX_PAGES,
+        pdf_strategy=PDF_SAMPLE_STRATEGY,
+        image_max_edge=IMAGE_MAX_EDGE,
+        image_format=IMAGE_FORMAT,
+        image_quality=IMAGE_QUALITY,
+        image_max_pixels=IMAGE_MAX_PIXELS,
+        rules_threshold=RULES_CONFIDENCE_THRESHOLD,
+        batch_size=BATCH_SIZE,
+        batch_concurrency=BATCH_CONCURRENCY,
+        batch_combine_pdfs=BATCH_COMBINE_PDFS,
+        client=inference_client,
+        categories=categories,
+        structured_output=STRUCTURED_OUTPUT,
+        max_output_tokens=MAX_OUTPUT_TOKENS,
+        similarity=similarity_index,
+        routes=MODEL_ROUTES,
+        scanned_pages=SCANNED_PDF_PAGES,
+        scanned_dpi=SCANNED_PDF_DPI,
+    )
+    def start_backend():
+        """Import the inference stack and load the models while the observer already runs"""
+        started = time.perf_counter()
+        inference_client.connect()
+        logger.debug("Inference client ready in %.2fs", time.perf_counter() - started)
+        if MODEL_WARM_UP:
+            ai_processor.warm_up()
+
+    threading.Thread(target=start_backend, name="declutter-backend", daemon=True).start()
+
+    # Stage transitions are journaled so files in flight survive a restart
+    journal = JobJournal(JOURNAL_PATH, JOURNAL_COMMIT_INTERVAL) if JOURNAL_PATH else None
+
+    def record_stage(file_info, stage, **data):
+        if journal is not None:
+            journal.record(file_info, stage, **data)
+
+    def finish(file_info, status, category=None):
+        metrics.file_done(file_info, status, category)
+        record_stage(file_info, "done", status=status)
+
+    def read_pdf(file_info):
+        """Read the PDF once for both the displayed metadata and the AI text sample"""
+        file_path = file_info["path"]
+        if not utils.is_pdf(file_path):
+            return None
+        # A sample journaled before a restart is reused
+        if file_info.get("pdf_sample") is not None:
+            return file_info["pdf_sample"]
+        try:
+            pdf_sample = ai_processor.sample_pdf(file_path)
+            display_pdf_info(file_path, pdf_sample["metadata"])
+            record_stage(file_info, "extracted", pdf_sample=pdf_sample)
+            return pdf_sample
+        except Exception as e:
+            logger.warning("Could not read PDF %s: %s", file_path, e)
+            return None
+
+    def organize(file_info, result):
+        """Move a file according to its AI analysis result"""
+        file_path = file_info["path"]
+        logger.debug("AI analysis result for %s: %s", file_path, result)
+
+        # Organize the file based on AI analysis
+        output_dir = output_dirs.get(file_info.get("root"), ORGANIZATION_BASE_DIR)
+        organization_result = organizers[output_dir].organize_file(
+            file_path, result)
+        if organization_result["status"] == "success":
+            if file_info.get("hash"):
+                classification_cache.set_category(
+                    file_info["hash"], organization_result["category"])
+            finish(file_info, "organized", organization_result["category"])
+        else:
+            finish(file_info, "failed")
 
     # Set up callback for AI processing and organization
     def ai_and_organization_callback(file_info):
         file_path = file_info["path"]
 
-        # Display additional info for PDFs
-        if utils.is_pdf(file_path):
-            display_pdf_info(file_path)
-
         # Process with AI if it's an image or PDF
         if utils.is_image(file_path) or utils.is_pdf(file_path):
-            print(f"\nProcessing {file_info['extension']} file with AI...")
+            logger.debug("Processing %s file with AI: %s", file_info['extension'], file_path)
             try:
-                result = ai_processor.process_file(file_path)
-                print("\nAI Analysis Result:")
-                print(result)
-                print("=" * 50)
-
-                # Organize the file based on AI analysis
-                print("\nOrganizing file based on AI analysis...")
-                organization_result = file_organizer.organize_file(
-                    file_path, result)
-                if organization_result["status"] == "success":
-                    print(
-                        f"""✅ Successfully organized file to: {
-                            organization_result['new_path']}"""
-                    )
-                else:
-                    print(
-                        f"""❌ Failed to organize file: {
-                            organization_result['message']}"""
-                    )
+                # A file classified before a restart goes straight to organizing
+                result = file_info.get("result")
+                if result is None:
+                    # The PDF is only read if the cache and filename rules miss
+                    result = ai_processor.process_file(
+                        file_path, file_info.get("hash"), lambda: read_pdf(file_info))
+                    record_stage(file_info, "classified", result=result)
+                organize(file_info, result)
+            except utils.ImageTooLarge as e:
+                logger.warning("Leaving %s in place: %s", file_path, e)
+                finish(file_info, "skipped")
+            except InferenceUnavailable as e:
+                logger.warning("Inference unavailable, retrying %s later: %s", file_path, e)
+                metrics.inc("declutter_deferred_files_total")
+                pipelines[file_info.get("root")].defer(
+                    file_info, CIRCUIT_RESET_TIMEOUT)
+                return
+            except Exception as e:
+                logger.exception("Error processing %s with AI: %s", file_path, e)
+                finish(file_info, "error")
+        else:
+            finish(file_info, "skipped")
+
+        # Remember the file so a restart does not pick it up again
+        file_index.record_file(file_info)
 
+    # Bursts of downloads are classified together in fewer model calls
+    def batch_ai_and_organization_callback(file_infos):
+        batch = []
+        for file_info in file_infos:
+            file_path = file_info["path"]
+            if file_info.get("result") is not None:
+                # Classified before a restart, so nothing to ask the model
+                ai_and_organization_callback(file_info)
+            elif utils.is_image(file_path) or utils.is_pdf(file_path):
+                batch.append({
+                    **file_info,
+                    "pdf_sample": lambda file_info=file_info: read_pdf(file_info),
+                })
+            else:
+                finish(file_info, "skipped")
+                file_index.record_file(file_info)
+
+        logger.debug("Processing batch of %d files with AI", len(batch))
+        try:
+            results = ai_processor.process_batch(batch)
+        except Exception as e:
+            logger.exception("Error processing batch with AI: %s", e)
+            for file_info in batch:
+                finish(file_info, "error")
+            return
+        for file_info, result in zip(batch, results):
+            if result is None:
+                logger.warning("Inference unavailable, retrying %s later", file_info['path'])
+                metrics.inc("declutter_deferred_files_total")
+                file_info.pop("pdf_sample", None)
+                pipelines[file_info.get("root")].defer(
+                    file_info, CIRCUIT_RESET_TIMEOUT)
+                continue
+            if isinstance(result, utils.ImageTooLarge):
+                logger.warning("Leaving %s in place: %s", file_info['path'], result)
+                finish(file_info, "skipped")
+                file_index.record_file(file_info)
+                continue
+            record_stage(file_info, "classified", result=result)
+            try:
+                organize(file_info, result)
             except Exception as e:
-                print(f"Error processing file with AI: {str(e)}")
+                logger.exception("Error organizing %s: %s", file_info['path'], e)
+                finish(file_info, "error")
+            file_index.record_file(file_info)
 
-    # Set up callback for AI processing
-    file_detector.add_callback(ai_and_organization_callback)
+    # Completed downloads are queued so slow inference never blocks the observer.
+    # Every root gets its own pipeline, so a busy root cannot starve the others;
+    # the byte budget is shared so bursts across roots still bound memory
+    priority = FilePriority(
+        PRIORITY_EXTENSION_WEIGHTS, PRIORITY_RECENCY_WEIGHT, PRIORITY_AGING)
+    byte_budget = ByteBudget(int(MAX_INFLIGHT_MB * 1024 * 1024)) if MAX_INFLIGHT_MB > 0 else None
+    pipelines = {}
+    for root in watch_roots:
+        pipelines[root.path] = ProcessingPipeline(
+            ai_and_organization_callback,
+            root.max_workers or WORKER_COUNT,
+            QUEUE_SIZE,
+            batch_handler=batch_ai_and_organization_callback,
+            batch_size=BATCH_SIZE,
+            batch_window=BATCH_WINDOW,
+            priority=priority,
+            byte_budget=byte_budget,
+        )
+        pipelines[root.path].start()
+
+    def submit(file_info):
+        pipeline = pipelines.get(file_info.get("root"))
+        if pipeline is None:
+            logger.warning("No watch root for %s, skipping", file_info['path'])
+            return False
+        if journal is None:
+            return pipeline.submit(file_info)
+        return journal.submit(pipeline, file_info)
+
+    def resume_journal():
+        """Resubmit files that were in flight when the daemon stopped"""
+        resumed = 0
+        for job in journal.pending():
+            try:
+                stat_result = os.stat(job["path"])
+            except FileNotFoundError:
+                record_stage(job, "done", status="missing")
+                continue
+            file_info = {field: job[field] for field in JOB_FIELDS if field in job}
+            file_info["detected"] = time.monotonic()
+            # Earlier stages only still apply to the same content
+            if (stat_result.st_size, stat_result.st_mtime) == (job.get("size"), job.get("mtime")):
+                for field in ("pdf_sample", "result"):
+                    if job.get(field) is not None:
+                        file_info[field] = job[field]
+            else:
+                file_info.update(size=stat_result.st_size, mtime=stat_result.st_mtime)
+                file_info.pop("hash", None)
+            if submit(file_info):
+                resumed += 1
+        if resumed:
+            logger.info("Resumed %d files from the job journal", resumed)
+
+    file_detector.add_callback(submit)
+
+    # Queue depths are read when /metrics is scraped, not on every change
+    metrics.REGISTRY.gauge(
+        "declutter_queue_depth",
+        lambda: {path: pipeline.queue_depth() for path, pipeline in pipelines.items()},
+        "Files waiting for a worker, per watch root", label="root")
+    metrics.REGISTRY.gauge(
+        "declutter_deferred_files",
+        lambda: {path: pipeline.deferred_count() for path, pipeline in pipelines.items()},
+        "Files waiting for the inference host to come back, per watch root", label="root")
+    if byte_budget is not None:
+        metrics.REGISTRY.gauge(
+            "declutter_bytes_in_flight", lambda: byte_budget.in_flight,
+            "Total size of the files being processed")
+    metrics.REGISTRY.gauge(
+        "declutter_pending_writes", file_detector.completion.pending_count,
+        "Files still being written")
+    metrics_server = None
+    if METRICS_PORT:
+        try:
+            metrics_server = MetricsServer((METRICS_HOST, METRICS_PORT), metrics.REGISTRY)
+            metrics_server.start()
+            logger.info("Metrics at http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.warning("Could not serve metrics on port %d: %s", METRICS_PORT, e)
+    if TRACE_PATH:
+        metrics.REGISTRY.open_trace(os.path.expanduser(TRACE_PATH))
 
     # Set up file system observer
+    file_detector.start()
     observer = Observer()
-    observer.schedule(file_detector, DOWNLOADS_PATH, recursive=False)
+    for root in watch_roots:
+        observer.schedule(file_detector, root.path, recursive=root.recursive)
     observer.start()
 
-    print(f"Auto-processor watching downloads folder: {DOWNLOADS_PATH}")
-    print(f"Using AI inference host: {INFERENCE_HOST}")
-    print(f"Organizing files to: {ORGANIZATION_BASE_DIR}")
-    print("Press Ctrl+C to stop...")
+    for root in watch_roots:
+        logger.info(
+            "Auto-processor watching: %s%s -> %s with %d workers", root.path,
+            " (recursive)" if root.recursive else "", output_dirs[root.path],
+            root.max_workers or WORKER_COUNT)
+    logger.info("Using AI inference host: %s", INFERENCE_HOST)
+    logger.info("Queue size per root: %d", QUEUE_SIZE)
+    logger.info("Press Ctrl+C to stop...")
+
+    # Files that were in flight go first; the scan below skips them as already queued
+    if journal is not None:
+        resume_journal()
+
+    # Catch up on files that arrived while the daemon was not running
+    if STARTUP_SCAN:
+        scanner = BacklogScanner(
+            file_index,
+            submit,
+            file_detector.hash_cache,
+            SCAN_RATE,
+            ignore=file_detector.is_ignored,
+            watch_roots=watch_roots,
+        )
+
+        def scan_backlog():
+            for root in watch_roots:
+                queued = scanner.scan(root.path, root.recursive)
+                logger.info("Startup scan queued %d files from %s", queued, root.path)
+
+        threading.Thread(target=scan_backlog, name="declutter-backlog",
+                         daemon=True).start()
 
     try:
         while True:
             time.sleep(1)
             file_detector.cleanup_stale_tracking()
+            for pipeline in pipelines.values():
+                pipeline.retry_deferred()
+            metrics.REGISTRY.flush()
     finally:
         observer.stop()
         observer.join()
+        file_detector.stop()
+        for pipeline in pipelines.values():
+            pipeline.stop()
+        if journal is not None:
+            journal.close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        metrics.REGISTRY.close()
+        logger.info("File events: %s", file_detector.completion.stats())
+        stats = classification_cache.stats()
+        logger.info(
+            "Classification cache: %d hits, %d misses", stats['hits'], stats['misses'])
+        classification_cache.close()
+        file_index.close()
+        if similarity_index is not None:
+            logger.info("Similarity index: %s", similarity_index.stats())
+            similarity_index.close()
+        logger.info("Files answered per tier: %s", ai_processor.tier_stats())
+        stats = ai_processor.inference_stats()
+        logger.info(
+            "Model calls: %d, %.1f output tokens and %.2fs per call",
+            stats['calls'], stats['output_tokens_per_call'], stats['seconds_per_call'])
+        for route, route_stats in ai_processor.route_stats().items():
+            logger.info(
+                "Route %s (%s): %d calls, %.2fs per call", route, route_stats['model'],
+                route_stats['calls'], route_stats['seconds_per_call'])
 
 
 if __name__ == "__main__":
+    # `main.py organize <dir>` runs a one-shot pass over an existing tree
+    if sys.argv[1:2] == ["organize"]:
+        import cli
+        sys.exit(cli.main(sys.argv[2:]))
     main()
@@ -0,0 +1,258 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached hash up to a slow model call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class _Histogram:
+    """Cumulative bucket counts, sum and count for one label set"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class TraceWriter:
+    """Appends one JSON object per line to a trace file
+
+    Lines are buffered and written out by flush(), so tracing a burst costs no
+    more than a dict and a json.dumps per event.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps({"ts": time.time(), **record}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MetricsRegistry:
+    """Counters, histograms and gauges rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._counters = {}  # name -> {label tuple: value}
+        self._histograms = {}  # name -> {label tuple: _Histogram}
+        self._gauges = {}  # name -> (callback, label name or None)
+        self._help = {}
+        self._lock = threading.Lock()
+        self.trace = None
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Record one value in a histogram"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def gauge(self, name, callback, help_text=None, label=None):
+        """Register a gauge read at scrape time
+
+        With a label, callback returns {label value: value} instead of a number.
+        """
+        self._gauges[name] = (callback, label)
+        if help_text:
+            self.describe(name, help_text)
+
+    @contextmanager
+    def stage(self, name, path=None):
+        """Time a pipeline stage (hash, extract, encode, inference, move)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - started, path)
+
+    def record_stage(self, name, seconds, path=None):
+        """Record a stage timed elsewhere, e.g. one request of a concurrent batch"""
+        self.observe("declutter_stage_seconds", seconds, stage=name)
+        if self.trace is not None:
+            self.trace.write({"event": "stage", "stage": name, "path": path, "seconds": seconds})
+
+    def file_done(self, file_info, status, category=None):
+        """Count a finished file and its time from detection to done"""
+        self.inc("declutter_files_total", status=status)
+        detected = file_info.get("detected")
+        elapsed = time.monotonic() - detected if detected is not None else None
+        if elapsed is not None:
+            self.observe("declutter_file_seconds", elapsed, status=status)
+        if self.trace is not None:
+            self.trace.write({
+                "event": "file",
+                "path": file_info.get("path"),
+                "hash": file_info.get("hash"),
+                "size": file_info.get("size"),
+                "status": status,
+                "category": category,
+                "seconds": elapsed,
+            })
+
+    def open_trace(self, path):
+        """Start writing stage and file events to a JSON-lines file"""
+        self.trace = TraceWriter(path)
+
+    def flush(self):
+        if self.trace is not None:
+            self.trace.flush()
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    @staticmethod
+    def _labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+            for name, value in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        """The current values in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {
+                    key: (h.buckets, list(h.counts), h.sum, h.count)
+                    for key, h in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+
+        for name in sorted(counters):
+            header(name, "counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{name}{self._labels(key)} {value}")
+
+        for name in sorted(histograms):
+            header(name, "histogram")
+            for key, (buckets, counts, total, count) in sorted(histograms[name].items()):
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(
+                        f"{name}_bucket{self._labels(key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{self._labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self._labels(key)} {total}")
+                lines.append(f"{name}_count{self._labels(key)} {count}")
+
+        for name in sorted(self._gauges):
+            callback, label = self._gauges[name]
+            try:
+                value = callback()
+            except Exception as e:
+                logger.warning("Could not read gauge %s: %s", name, e)
+                continue
+            header(name, "gauge")
+            if label is None:
+                lines.append(f"{name} {value}")
+            else:
+                for label_value, item in sorted(value.items()):
+                    lines.append(f"{name}{self._labels([(label, label_value)])} {item}")
+
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves GET /metrics from the server's registry"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Local HTTP server exposing /metrics for Prometheus to scrape"""
+
+    daemon_threads = True
+
+    def __init__(self, address, registry):
+        super().__init__(address, _MetricsHandler)
+        self.registry = registry
+
+    def start(self):
+        threading.Thread(
+            target=self.serve_forever, name="declutter-metrics", daemon=True).start()
+
+
+# Shared by every module, like the logging root
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("declutter_stage_seconds", "Time spent in each processing stage")
+REGISTRY.describe("declutter_file_seconds", "Time from detection until a file is done")
+REGISTRY.describe("declutter_files_total", "Files finished, by outcome")
+REGISTRY.describe("declutter_cache_requests_total", "Hash and classification cache lookups")
+REGISTRY.describe("declutter_tier_files_total", "Files answered by cache, rules or model")
+REGISTRY.describe("declutter_inference_errors_total", "Failed model requests, by reason")
+REGISTRY.describe("declutter_inference_retries_total", "Model requests retried after a transient failure")
+REGISTRY.describe("declutter_route_seconds", "Model request time per route and model")
+REGISTRY.describe("declutter_inference_output_tokens_total", "Tokens generated by the model")
+REGISTRY.describe("declutter_deferred_files_total", "Files put back because the inference host was down")
+REGISTRY.describe("declutter_bytes_moved_total", "Bytes of organized files")
+REGISTRY.describe("declutter_bytes_copied_total", "Bytes copied for moves across filesystems")
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+stage = REGISTRY.stage
+record_stage = REGISTRY.record_stage
+file_done = REGISTRY.file_done
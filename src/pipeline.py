@@ -0,0 +1,251 @@
+import heapq
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FilePriority:
+    """Scores files so that small, recent ones are processed first (lower runs sooner)
+
+    The score is log2 of the size in KiB times a per-extension weight, plus
+    recency_weight * log2(1 + age in hours) from the file's mtime, so live
+    downloads go ahead of an old backlog. Every aging seconds spent waiting is
+    worth one point, so large files still get their turn during a long burst.
+    """
+
+    def __init__(self, extension_weights=None, recency_weight=1.0, aging=60.0):
+        if aging <= 0:
+            raise ValueError("aging must be positive")
+        # Extensions match with or without their leading dot, e.g. "pdf" or ".pdf"
+        self.extension_weights = {
+            "." + ext.lower().lstrip("."): weight
+            for ext, weight in (extension_weights or {}).items()}
+        self.recency_weight = recency_weight
+        self.aging = aging
+
+    def __call__(self, file_info):
+        weight = self.extension_weights.get(file_info.get("extension", ""), 1.0)
+        score = weight * math.log2(2 + (file_info.get("size") or 0) / 1024)
+        mtime = file_info.get("mtime")
+        if mtime is not None:
+            age_hours = max(0.0, time.time() - mtime) / 3600
+            score += self.recency_weight * math.log2(1 + age_hours)
+        return score + time.monotonic() / self.aging
+
+
+class ByteBudget:
+    """Caps the total size of files being processed, shared by all pipelines
+
+    Callers are admitted in arrival order, so a large file waiting for room is
+    not overtaken forever by small ones. A file larger than the whole budget is
+    admitted once nothing else is in flight and then runs alone.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._tickets = itertools.count()
+        self._next_admission = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size):
+        """Block until size more bytes fit the budget"""
+        with self._condition:
+            ticket = next(self._tickets)
+            while ticket != self._next_admission or (
+                    self.in_flight and self.in_flight + size > self.max_bytes):
+                self._condition.wait()
+            self._next_admission += 1
+            self.in_flight += size
+            self._condition.notify_all()
+
+    def release(self, size):
+        with self._condition:
+            self.in_flight -= size
+            self._condition.notify_all()
+
+
+class ProcessingPipeline:
+    """Bounded work queue feeding a pool of worker threads
+
+    With a batch_handler and batch_size > 1, each worker gathers up to
+    batch_size files arriving within batch_window seconds and hands them
+    over together.
+
+    Waiting files are taken in order of priority(file_info), lowest first
+    (FIFO without one). With a ByteBudget, workers only start files while
+    the sizes of all files being processed fit it.
+    """
+
+    def __init__(
+        self,
+        handler,
+        worker_count=4,
+        max_queue_size=100,
+        submit_timeout=None,
+        batch_handler=None,
+        batch_size=1,
+        batch_window=0.5,
+        priority=None,
+        byte_budget=None,
+    ):
+        self.handler = handler
+        self.batch_handler = batch_handler
+        self.batch_size = max(1, int(batch_size))
+        self.batch_window = batch_window
+        self.worker_count = max(1, int(worker_count))
+        self.submit_timeout = submit_timeout
+        self.priority = priority
+        self.queue = queue.PriorityQueue(maxsize=max(1, int(max_queue_size)))
+        self.byte_budget = byte_budget
+        self.workers = []
+        self._in_flight = set()
+        self._deferred = []  # heap of (ready_time, sequence, file_info)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Start the worker threads"""
+        for index in range(self.worker_count):
+            worker = threading.Thread(
+                target=self._worker_loop, name=f"declutter-worker-{index}", daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, file_info, on_accept=None):
+        """Queue a file for processing, blocking while the queue is full
+
+        on_accept is called once the path is accepted but before the file is
+        queued, so no worker can have processed it yet.
+        """
+        path = file_info["path"]
+        with self._lock:
+            if path in self._in_flight:
+                logger.debug("Already queued for processing: %s", path)
+                return False
+            self._in_flight.add(path)
+
+        if on_accept is not None:
+            on_accept()
+        try:
+            # Blocking here is the backpressure: the caller slows down until a
+            # worker frees a slot instead of the queue growing without bound
+            self.queue.put(self._entry(file_info), timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._in_flight.discard(path)
+            logger.warning("Processing queue full, dropping: %s", path)
+            return False
+        return True
+
+    def _entry(self, file_info):
+        """Queue entry ordered by priority, then arrival; stop sentinels sort last"""
+        if file_info is None:
+            return (math.inf, next(self._sequence), None)
+        key = self.priority(file_info) if self.priority is not None else 0
+        return (key, next(self._sequence), file_info)
+
+    def defer(self, file_info, delay):
+        """Hold a file back and resubmit it once delay seconds have passed"""
+        with self._lock:
+            heapq.heappush(
+                self._deferred,
+                (time.monotonic() + delay, next(self._sequence), file_info),
+            )
+
+    def retry_deferred(self):
+        """Resubmit deferred files whose delay has elapsed"""
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            while self._deferred and self._deferred[0][0] <= now:
+                ready.append(heapq.heappop(self._deferred)[2])
+        for file_info in ready:
+            self.submit(file_info)
+
+    def deferred_count(self):
+        """Number of files waiting to be retried"""
+        return len(self._deferred)
+
+    def queue_depth(self):
+        """Number of files waiting for a worker"""
+        return self.queue.qsize()
+
+    def _worker_loop(self):
+        """Take files off the queue and run the handler until stopped"""
+        while True:
+            file_info = self.queue.get()[2]
+            if file_info is None:
+                self.queue.task_done()
+                return
+
+            if self.batch_handler is None or self.batch_size == 1:
+                self._run(self.handler, file_info, [file_info])
+                continue
+
+            batch, stop = self._collect_batch(file_info)
+            if len(batch) == 1:
+                self._run(self.handler, batch[0], batch)
+            else:
+                self._run(self.batch_handler, batch, batch)
+            if stop:
+                return
+
+    def _collect_batch(self, first):
+        """Gather more files for a batch until it is full or the window closes"""
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                file_info = self.queue.get(timeout=remaining)[2]
+            except queue.Empty:
+                break
+            if file_info is None:
+                self.queue.task_done()
+                return batch, True
+            batch.append(file_info)
+        return batch, False
+
+    def _run(self, handler, argument, file_infos):
+        """Call a handler and release the queue slots of the files it covered"""
+        size = sum(file_info.get("size") or 0 for file_info in file_infos)
+        if self.byte_budget is not None:
+            self.byte_budget.acquire(size)
+        try:
+            handler(argument)
+        except Exception as e:
+            paths = ", ".join(file_info["path"] for file_info in file_infos)
+            logger.exception("Error processing %s: %s", paths, e)
+        finally:
+            if self.byte_budget is not None:
+                self.byte_budget.release(size)
+            with self._lock:
+                for file_info in file_infos:
+                    self._in_flight.discard(file_info["path"])
+            for _ in file_infos:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until every queued file has been processed"""
+        self.queue.join()
+
+    def stop(self):
+        """Signal the workers to finish queued work and exit"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        for _ in self.workers:
+            self.queue.put(self._entry(None))
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
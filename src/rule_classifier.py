@@ -0,0 +1,80 @@
+import re
+from pathlib import Path
+import utils
+
+
+class RuleClassifier:
+    """Cheap heuristic classifier that runs before the AI model"""
+
+    def __init__(self):
+        self._setup_rules()
+
+    def _setup_rules(self):
+        """Define hard-coded rules and the confidence each one carries"""
+        self.filename_rules = [
+            (re.compile(r"^(screenshot|screen shot|screen_shot|scr)[ _-]", re.I), "images", 0.95),
+            (re.compile(r"^(img|dsc|dscn|pxl|photo)[ _-]?\d", re.I), "images", 0.9),
+            (re.compile(r"(invoice|receipt|rechnung|factura)", re.I), "invoices", 0.85),
+            (re.compile(r"(slides|deck|presentation)", re.I), "presentations", 0.7),
+            (re.compile(r"(statement|bill)[ _-]", re.I), "invoices", 0.6),
+        ]
+        self.producer_rules = [
+            (re.compile(r"powerpoint|keynote|impress|google slides", re.I), "presentations", 0.9),
+            (re.compile(r"excel|numbers|libreoffice calc|google sheets", re.I), "spreadsheets", 0.85),
+        ]
+        self.text_keywords = {
+            "invoices": [
+                "invoice number", "invoice no", "invoice date", "amount due",
+                "bill to", "vat", "subtotal", "total due", "payment terms",
+                "receipt",
+            ],
+            "presentations": ["agenda", "thank you", "any questions", "next steps"],
+        }
+        self.keyword_patterns = {
+            category: re.compile(
+                r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b", re.I)
+            for category, keywords in self.text_keywords.items()
+        }
+
+    def classify(self, file_path, pdf_sample=None):
+        """Return (category, confidence, reasons) for the strongest rule match"""
+        scores = {}
+        reasons = {}
+
+        def add(category, confidence, reason):
+            # Combine independent evidence: each rule removes part of the remaining doubt
+            previous = scores.get(category, 0.0)
+            scores[category] = 1 - (1 - previous) * (1 - confidence)
+            reasons.setdefault(category, []).append(reason)
+
+        name = Path(file_path).name
+        for pattern, category, confidence in self.filename_rules:
+            if pattern.search(name):
+                add(category, confidence, f"filename matches {pattern.pattern}")
+
+        if utils.is_pdf(file_path) and pdf_sample is not None:
+            metadata = pdf_sample.get("metadata") or {}
+            producer = " ".join(
+                filter(None, [metadata.get("producer"), metadata.get("creator")]))
+            for pattern, category, confidence in self.producer_rules:
+                if producer and pattern.search(producer):
+                    add(category, confidence, f"produced by {producer}")
+
+            width = metadata.get("page_width")
+            height = metadata.get("page_height")
+            if width and height and width / height > 1.3:
+                add("presentations", 0.5, "landscape slide-shaped pages")
+
+            text = pdf_sample.get("text", "")
+            for category, pattern in self.keyword_patterns.items():
+                hits = {match.lower() for match in pattern.findall(text)}
+                if hits:
+                    # Two distinct keywords are decent evidence, four or more strong
+                    confidence = min(0.95, 0.3 + 0.2 * len(hits))
+                    add(category, confidence, f"text mentions {', '.join(sorted(hits))}")
+
+        if not scores:
+            return None, 0.0, []
+
+        category = max(scores, key=scores.get)
+        return category, scores[category], reasons[category]
@@ -0,0 +1,206 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from utils import check_image_pixels
+
+SIGNATURE_BITS = 64
+# Flat or plain-gradient images set almost no (or almost every) bit and would match each other
+MIN_IMAGE_DETAIL_BITS = 8
+_WORD = re.compile(r"[a-z]{2,}")
+
+
+def image_dhash(image_path, hash_size=8, max_pixels=None):
+    """64-bit difference hash: which neighbouring pixels get brighter in an 9x8 thumbnail
+
+    Re-saving at another quality or size barely changes it, unlike a content hash.
+    Images that would decode to more than max_pixels pixels raise ImageTooLarge.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img.seek(0)
+        if img.format == "JPEG":
+            img.draft("L", (hash_size * 8, hash_size * 8))
+        check_image_pixels(img, image_path, max_pixels)
+        size = (hash_size + 1, hash_size)
+        if img.mode in ("1", "P"):
+            # Palette images only resize with nearest-neighbour, so convert them first
+            small = img.convert("L").resize(size, Image.Resampling.BILINEAR, reducing_gap=3.0)
+        else:
+            # Shrinking first avoids a full-size grayscale copy of the image
+            small = img.resize(size, Image.Resampling.BILINEAR, reducing_gap=3.0).convert("L")
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] < pixels[offset + column + 1])
+    return value
+
+
+def has_image_detail(signature):
+    """Whether an image hash carries enough detail to compare"""
+    set_bits = signature.bit_count()
+    return MIN_IMAGE_DETAIL_BITS <= set_bits <= SIGNATURE_BITS - MIN_IMAGE_DETAIL_BITS
+
+
+def text_simhash(text, shingle=3, min_words=20):
+    """64-bit SimHash over word shingles, or None when there is too little text
+
+    Numbers are ignored, so a document regenerated with a new date or
+    reference number keeps (nearly) the same signature.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < min_words:
+        return None
+    features = Counter(
+        " ".join(words[index:index + shingle])
+        for index in range(len(words) - shingle + 1)
+    )
+    weights = [0] * SIGNATURE_BITS
+    for feature, count in features.items():
+        digest = int.from_bytes(
+            hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIGNATURE_BITS):
+            weights[bit] += count if digest >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class SimilarityIndex:
+    """Finds earlier files whose perceptual or text signature is within a Hamming distance
+
+    Signatures are split into max_distance + 1 bands; two signatures that differ
+    in at most max_distance bits must agree exactly on at least one band, so
+    only entries sharing a band bucket are compared. All entries persist in
+    SQLite, while the in-memory buckets hold the memory_entries most recent.
+    """
+
+    def __init__(self, db_path, max_distance=6, memory_entries=10000, max_entries=50000):
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max_distance
+        self.band_count = max_distance + 1
+        self.band_bits = SIGNATURE_BITS // self.band_count
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (kind, signature) -> (hash, result)
+        self._buckets = {}  # (kind, band, value) -> set of signatures
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._adds_since_prune = 0
+
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS similarity (
+                kind TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (kind, signature)
+            )
+            """
+        )
+        self.prune()
+        self._load()
+
+    def _load(self):
+        """Fill the in-memory buckets with the most recent entries"""
+        rows = self.conn.execute(
+            "SELECT kind, signature, hash, result FROM similarity ORDER BY created DESC LIMIT ?",
+            (self.memory_entries,),
+        ).fetchall()
+        for kind, signature, file_hash, result in reversed(rows):
+            self._remember(kind, int(signature, 16), file_hash, result)
+
+    def _bands(self, signature):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.band_count):
+            yield band, (signature >> (band * self.band_bits)) & mask
+
+    def _remember(self, kind, signature, file_hash, result):
+        key = (kind, signature)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self._entries[key] = (file_hash, result)
+            return
+        self._entries[key] = (file_hash, result)
+        for band, value in self._bands(signature):
+            self._buckets.setdefault((kind, band, value), set()).add(signature)
+        while len(self._entries) > self.memory_entries:
+            (old_kind, old_signature), _ = self._entries.popitem(last=False)
+            for band, value in self._bands(old_signature):
+                bucket = self._buckets.get((old_kind, band, value))
+                if bucket is not None:
+                    bucket.discard(old_signature)
+                    if not bucket:
+                        del self._buckets[(old_kind, band, value)]
+
+    def lookup(self, kind, signature):
+        """Return the closest earlier entry as {"hash", "result", "distance"}, or None"""
+        best = None
+        with self._lock:
+            candidates = set()
+            for band, value in self._bands(signature):
+                candidates.update(self._buckets.get((kind, band, value), ()))
+            for candidate in candidates:
+                distance = (candidate ^ signature).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            key = (kind, best[1])
+            self._entries.move_to_end(key)
+            file_hash, result = self._entries[key]
+        return {"hash": file_hash, "result": result, "distance": best[0]}
+
+    def add(self, kind, signature, file_hash, result):
+        """Remember the classification of a file's signature"""
+        with self._lock:
+            self._remember(kind, signature, file_hash, result)
+            self.conn.execute(
+                """
+                INSERT INTO similarity (kind, signature, hash, result, created)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(kind, signature) DO UPDATE SET
+                    hash = excluded.hash, result = excluded.result, created = excluded.created
+                """,
+                (kind, f"{signature:016x}", file_hash or "", result, time.time()),
+            )
+            self._adds_since_prune += 1
+            prune_due = self._adds_since_prune >= 100
+        if prune_due:
+            self.prune()
+
+    def prune(self):
+        """Keep at most max_entries of the newest signatures on disk"""
+        with self._lock:
+            self._adds_since_prune = 0
+            self.conn.execute(
+                """
+                DELETE FROM similarity WHERE rowid IN (
+                    SELECT rowid FROM similarity ORDER BY created DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        """Hit and miss counts since startup and entries held in memory"""
+        return {"hits": self.hits, "misses": self.misses, "in_memory": len(self._entries)}
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self.conn.close()
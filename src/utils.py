@@ -1,7 +1,26 @@
 import base64
 import hashlib
+import io
 from pathlib import Path
-import fitz
+
+# PyMuPDF and Pillow are imported inside the functions that need them: both are
+# slow to import and many callers (hashing, the organize CLI) never use them
+
+
+class ImageTooLarge(ValueError):
+    """An image that would decode to more pixels than allowed"""
+
+
+def check_image_pixels(img, image_path, max_pixels):
+    """Raise ImageTooLarge if an opened image would decode to more than max_pixels pixels
+
+    Only the header has been read at this point; for a JPEG, call draft() first
+    so the size it will actually decode at is checked.
+    """
+    width, height = img.size
+    if max_pixels is not None and width * height > max_pixels:
+        raise ImageTooLarge(
+            f"Image too large to decode: {image_path} is {width}x{height} pixels")
 
 
 def encode_image(image_path):
@@ -14,6 +33,50 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode('utf-8')
 
 
+def prepare_image(image_path, max_edge=1024, image_format="JPEG", quality=85, max_pixels=None):
+    """Downscale and re-encode an image for the vision model, returning (base64, mime type)
+
+    Only JPEG can be scaled down while decoding; any other format is decoded at
+    full resolution, so images with more than max_pixels pixels are refused
+    before decoding. A small compressed file can still decode to hundreds of MB.
+    """
+    path = Path(image_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Image not found: {image_path}")
+
+    from PIL import Image
+
+    image_format = image_format.upper()
+    with Image.open(path) as img:
+        # Animated images are represented by their first frame
+        img.seek(0)
+
+        # Let the JPEG decoder scale down while decoding instead of
+        # materialising every pixel of a large photo
+        if img.format == "JPEG":
+            img.draft("RGB", (max_edge, max_edge))
+
+        check_image_pixels(img, image_path, max_pixels)
+
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge))
+
+        if image_format == "JPEG" and img.mode != "RGB":
+            if "A" in img.getbands() or "transparency" in img.info:
+                rgba = img.convert("RGBA")
+                background = Image.new("RGB", rgba.size, (255, 255, 255))
+                background.paste(rgba, mask=rgba.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=image_format, quality=quality)
+
+    mime_type = f"image/{image_format.lower()}"
+    return base64.b64encode(buffer.getvalue()).decode('utf-8'), mime_type
+
+
 def get_mime_type(file_path):
     """Get MIME type based on file extension"""
     ext = Path(file_path).suffix.lower()
@@ -28,24 +91,140 @@ def get_mime_type(file_path):
     return mime_types.get(ext, 'application/octet-stream')
 
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF using PyMuPDF"""
+def select_pdf_pages(page_count, max_pages=None, strategy="first"):
+    """Choose which page numbers to sample from a document"""
+    if max_pages is None or page_count <= max_pages:
+        return list(range(page_count))
+    if max_pages <= 0:
+        return []
+
+    if strategy == "first_last":
+        head = (max_pages + 1) // 2
+        tail = max_pages - head
+        return list(range(head)) + list(range(page_count - tail, page_count))
+    if strategy == "spread":
+        if max_pages == 1:
+            return [0]
+        step = (page_count - 1) / (max_pages - 1)
+        return sorted({round(i * step) for i in range(max_pages)})
+    return list(range(max_pages))
+
+
+def iter_pdf_text(doc, page_numbers=None):
+    """Yield the text of each requested page of an open document"""
+    if page_numbers is None:
+        page_numbers = range(len(doc))
+    for page_num in page_numbers:
+        yield doc.load_page(page_num).get_text()
+
+
+def _sample_text(doc, max_chars=None, max_pages=None, strategy="first"):
+    """Collect page text until the character budget is used up"""
+    page_numbers = select_pdf_pages(len(doc), max_pages, strategy)
+    truncated = len(page_numbers) < len(doc)
+
+    # Sampled strategies share the budget between pages so later pages are represented
+    per_page = None
+    if max_chars is not None and strategy != "first" and page_numbers:
+        per_page = max(1, max_chars // len(page_numbers))
+
+    parts = []
+    remaining = max_chars
+    for page_text in iter_pdf_text(doc, page_numbers):
+        if per_page is not None and len(page_text) > per_page:
+            page_text = page_text[:per_page]
+            truncated = True
+        if remaining is not None:
+            if len(page_text) >= remaining:
+                parts.append(page_text[:remaining])
+                truncated = True
+                break
+            remaining -= len(page_text)
+        parts.append(page_text)
+
+    return "".join(parts).strip(), truncated
+
+
+def extract_text_from_pdf(pdf_path, max_chars=None, max_pages=None, strategy="first"):
+    """Extract text from PDF using PyMuPDF, stopping once the budget is reached"""
     path = Path(pdf_path)
     if not path.exists():
         raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
+    import fitz
+
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
+        with fitz.open(pdf_path) as doc:
+            text, _ = _sample_text(doc, max_chars, max_pages, strategy)
+        return text
+    except Exception as e:
+        raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text += page.get_text()
 
-        doc.close()
-        return text.strip()
+def read_pdf_sample(pdf_path, max_chars=4000, max_pages=10, strategy="first"):
+    """Open a PDF once and return a text sample together with its metadata"""
+    path = Path(pdf_path)
+    if not path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    import fitz
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            metadata = dict(doc.metadata or {})
+            metadata['page_count'] = len(doc)
+            if len(doc):
+                first_page = doc.load_page(0).rect
+                metadata['page_width'] = first_page.width
+                metadata['page_height'] = first_page.height
+            text, truncated = _sample_text(doc, max_chars, max_pages, strategy)
+        return {'text': text, 'truncated': truncated, 'metadata': metadata}
     except Exception as e:
-        raise Exception(f"Error extracting text from PDF: {str(e)}")
+        raise Exception(f"Error reading PDF: {str(e)}")
+
+
+def render_pdf_pages(pdf_path, max_pages=2, max_edge=1024, dpi=100, image_format="JPEG", quality=80):
+    """Render the first pages of a PDF into one grayscale image, returning (base64, mime type)
+
+    Pages are rendered at no more than dpi and stacked vertically so the whole
+    image fits in max_edge pixels, which bounds both render time and payload.
+    Returns None for a document without pages.
+    """
+    path = Path(pdf_path)
+    if not path.exists():
+        raise FileNotFoundError(f"PDF not found: {pdf_path}")
+
+    import fitz
+    from PIL import Image
+
+    try:
+        with fitz.open(pdf_path) as doc:
+            page_count = min(len(doc), max_pages)
+            if not page_count:
+                return None
+            pages = [doc.load_page(page_num) for page_num in range(page_count)]
+            width = max(page.rect.width for page in pages)
+            height = sum(page.rect.height for page in pages)
+            # Scale is in pixels per point (1/72 inch)
+            scale = min(dpi / 72, max_edge / max(width, height))
+            matrix = fitz.Matrix(scale, scale)
+            images = []
+            for page in pages:
+                pixmap = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+                images.append(Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples))
+    except Exception as e:
+        raise Exception(f"Error rendering PDF: {str(e)}")
+
+    sheet = Image.new("L", (max(img.width for img in images), sum(img.height for img in images)), 255)
+    top = 0
+    for img in images:
+        sheet.paste(img, (0, top))
+        top += img.height
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, format=image_format.upper(), quality=quality)
+    mime_type = f"image/{image_format.lower()}"
+    return base64.b64encode(buffer.getvalue()).decode('utf-8'), mime_type
 
 
 def extract_metadata_from_pdf(pdf_path):
@@ -54,6 +233,8 @@ def extract_metadata_from_pdf(pdf_path):
     if not path.exists():
         raise FileNotFoundError(f"PDF not found: {pdf_path}")
 
+    import fitz
+
     try:
         doc = fitz.open(pdf_path)
         metadata = doc.metadata
@@ -75,17 +256,39 @@ def is_image(file_path):
     return Path(file_path).suffix.lower() in image_extensions
 
 
-def get_file_hash(file_path):
-    """Calculate MD5 hash of a file for content identification"""
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def _new_hasher(algorithm):
+    """Create a hash object for the given algorithm name"""
+    if algorithm == "xxhash":
+        try:
+            import xxhash
+        except ImportError:
+            raise ValueError("xxhash algorithm requested but xxhash is not installed")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        # 128-bit digest keeps index keys short while staying collision-safe
+        return hashlib.blake2b(digest_size=16)
+    return hashlib.new(algorithm)
+
+
+def get_file_hash(file_path, algorithm="md5"):
+    """Calculate a content hash of a file for content identification"""
     path = Path(file_path)
     if not path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    hash_md5 = hashlib.md5()
+    hasher = _new_hasher(algorithm)
     try:
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                hasher.update(view[:size])
+        return hasher.hexdigest()
     except Exception as e:
         raise Exception(f"Error calculating file hash: {str(e)}")
@@ -0,0 +1,113 @@
+import fnmatch
+import json
+import os
+import re
+
+# Partial browser and editor downloads that must never be processed
+DEFAULT_EXCLUDE = ["*.crdownload", "*.part", "*.tmp", "*.download"]
+
+
+class PathMatcher:
+    """Glob patterns compiled once into a single regular expression
+
+    Patterns without a slash match the file name; patterns with a slash match
+    the path relative to the watch root, e.g. "archive/**".
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns or [])
+        name_patterns = [p for p in self.patterns if "/" not in p]
+        path_patterns = [p for p in self.patterns if "/" in p]
+        self._name_regex = self._compile(name_patterns)
+        self._path_regex = self._compile(path_patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+    def matches(self, name, relative_path=None):
+        """Whether a file name (or its root-relative path) matches any pattern"""
+        if self._name_regex is not None and self._name_regex.match(name):
+            return True
+        if self._path_regex is not None and relative_path is not None:
+            return bool(self._path_regex.match(relative_path))
+        return False
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+
+class WatchRoot:
+    """A watched folder with its own recursion, filters, output base and worker quota"""
+
+    def __init__(
+        self,
+        path,
+        recursive=False,
+        include=None,
+        exclude=None,
+        output_dir=None,
+        max_workers=None,
+    ):
+        self.path = os.path.normpath(os.path.expanduser(path))
+        self.recursive = recursive
+        self.include = PathMatcher(include)
+        self.exclude = PathMatcher(DEFAULT_EXCLUDE + list(exclude or []))
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+
+    def contains(self, path):
+        """Whether a path lives under this root (directly, unless recursive)"""
+        parent = os.path.dirname(path)
+        if parent == self.path:
+            return True
+        return self.recursive and path.startswith(self.path + os.sep)
+
+    def accepts(self, path):
+        """Whether a file under this root should be processed"""
+        name = os.path.basename(path)
+        relative_path = os.path.relpath(path, self.path).replace(os.sep, "/")
+        if self.exclude.matches(name, relative_path):
+            return False
+        return not self.include or self.include.matches(name, relative_path)
+
+
+class WatchRoots:
+    """Looks up the root a path belongs to and applies its filters"""
+
+    def __init__(self, roots):
+        # Longest path first so nested roots win over their parents
+        self.roots = sorted(roots, key=lambda root: len(root.path), reverse=True)
+
+    def root_for(self, path):
+        """Return the root that owns a path, or None"""
+        for root in self.roots:
+            if root.contains(path):
+                return root
+        return None
+
+    def is_ignored(self, path):
+        """Whether events for a path should be dropped before any stat or hash"""
+        root = self.root_for(path)
+        return root is None or not root.accepts(path)
+
+    def __iter__(self):
+        return iter(self.roots)
+
+
+def load_watch_roots(config_path=None, default_path=None):
+    """Read watch roots from a JSON config file, or watch default_path alone
+
+    The file looks like:
+    {"roots": [{"path": "/data/drop", "recursive": true, "include": ["*.pdf"],
+                "exclude": ["archive/**"], "output_dir": "/data/sorted",
+                "max_workers": 2}]}
+    """
+    if not config_path:
+        return WatchRoots([WatchRoot(default_path)])
+
+    with open(os.path.expanduser(config_path)) as f:
+        config = json.load(f)
+    return WatchRoots([WatchRoot(**root) for root in config["roots"]])
@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from job_journal import JobJournal  # noqa: E402
+from pipeline import ProcessingPipeline  # noqa: E402
+
+
+class SlowReturningPipeline(ProcessingPipeline):
+    """Returns from submit() only after a worker has finished the file, as a preempted caller would"""
+
+    def submit(self, file_info, on_accept=None):
+        self.finished.clear()
+        accepted = super().submit(file_info, on_accept)
+        if accepted:
+            self.finished.wait(5)
+        return accepted
+
+
+def test_files_finished_before_submit_returns_stay_closed(tmp_path):
+    """A worker finishing a file before submit() returns must not reopen its job"""
+    path = tmp_path / "journal.jsonl"
+    journal = JobJournal(path, commit_interval=0.001)
+
+    def handler(file_info):
+        journal.record(file_info, "done", status="skipped")
+        pipeline.finished.set()
+
+    pipeline = SlowReturningPipeline(handler, worker_count=2)
+    pipeline.finished = threading.Event()
+    pipeline.start()
+    for index in range(20):
+        assert journal.submit(pipeline, {"path": f"/downloads/file_{index}.txt", "size": 1})
+    pipeline.join()
+    pipeline.stop()
+    journal.close()
+
+    reopened = JobJournal(path)
+    assert reopened.pending() == []
+    reopened.close()
+
+
+def test_dropped_files_are_closed(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = JobJournal(path, commit_interval=0.001)
+    # Never started, so the single slot stays taken and the second file is dropped
+    pipeline = ProcessingPipeline(lambda file_info: None, max_queue_size=1, submit_timeout=0.01)
+    assert journal.submit(pipeline, {"path": "/downloads/a.pdf"})
+    assert not journal.submit(pipeline, {"path": "/downloads/b.pdf"})
+    # A path already in flight is not closed by a rejected resubmission
+    assert not journal.submit(pipeline, {"path": "/downloads/a.pdf"})
+    journal.close()
+
+    reopened = JobJournal(path)
+    assert [job["path"] for job in reopened.pending()] == ["/downloads/a.pdf"]
+    reopened.close()